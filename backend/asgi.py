@@ -0,0 +1,94 @@
+"""
+ASGI version of the quiz API, for exam windows with many concurrent candidates.
+
+Run from the backend directory with uvicorn:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+The exam routes (/api/generate-quiz and /api/submit-answer) are async: with
+the question bank snapshot (QUESTION_BANK_SNAPSHOT=true) they are answered
+from memory on the event loop (checking the snapshot for a newer database
+runs in a thread), otherwise their SQLite queries run in a bounded thread
+pool (DB_THREADS threads), so a slow query never blocks the loop and
+waiting clients only cost a coroutine each. Every other route is the Flask
+app, run in a thread pool of the same size. Both routes build their
+responses with the same functions as the Flask app, so the JSON
+contracts are identical.
+"""
+import json
+import os
+from contextlib import asynccontextmanager
+
+import anyio
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route, request_response
+
+import quiz_app_backend as backend
+
+DB_THREADS = int(os.environ.get('DB_THREADS', 16))
+
+_db_limiter = None
+
+async def run_backend(func, *args):
+    """Call a backend function without blocking the event loop"""
+    if backend.USE_SNAPSHOT and backend.question_bank_is_fresh():
+        # In-memory lookups take microseconds; a thread hop would cost more.
+        # When the snapshot is due a check (which may hash and reload the
+        # database), the whole call goes to a thread instead.
+        return func(*args)
+    return await anyio.to_thread.run_sync(func, *args, limiter=_db_limiter)
+
+async def read_json(request):
+    """The request's JSON body, or None if it isn't valid JSON"""
+    try:
+        data = json.loads(await request.body())
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def generate_quiz(request):
+    """Generate a quiz based on selected topics and length"""
+    data = await read_json(request)
+    if data is None:
+        return JSONResponse({"success": False, "error": "Invalid JSON body"}, 400)
+    payload, status = await run_backend(backend.build_quiz, data)
+    return JSONResponse(payload, status)
+
+async def submit_answer(request):
+    """Submit an answer for a question and get feedback"""
+    data = await read_json(request)
+    if data is None:
+        return JSONResponse({"success": False, "error": "Invalid JSON body"}, 400)
+    payload, status = await run_backend(backend.check_answer, data)
+    return JSONResponse(payload, status)
+
+def exam_route(path, endpoint):
+    """POST route for an async endpoint, with the CORS handling Flask-CORS gives the Flask routes"""
+    return Route(
+        path,
+        CORSMiddleware(request_response(endpoint), allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        methods=['POST', 'OPTIONS']
+    )
+
+@asynccontextmanager
+async def lifespan(app):
+    """Preload the backend (see create_app) before serving"""
+    global _db_limiter
+    _db_limiter = anyio.CapacityLimiter(DB_THREADS)
+    await anyio.to_thread.run_sync(backend.create_app)
+    try:
+        yield
+    finally:
+        backend.close_db_pool()
+
+app = Starlette(
+    routes=[
+        exam_route('/api/generate-quiz', generate_quiz),
+        exam_route('/api/submit-answer', submit_answer),
+        Mount('/', WSGIMiddleware(backend.app, workers=DB_THREADS)),
+    ],
+    lifespan=lifespan
+)
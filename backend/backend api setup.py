@@ -1,14 +1,31 @@
 cd backend
 
 # Install required packages
-pip install flask flask-cors python-dotenv
+pip install flask flask-cors python-dotenv gunicorn waitress
 
 # Create .env file for configuration
 cat <<EOF > .env
 DB_PATH=../pdf-extraction/extracted_data/nuclear_quiz.db
 IMAGES_DIR=../pdf-extraction/extracted_data/images
 PORT=5000
+# Production server: worker processes, threads per worker, shutdown grace period
+WEB_CONCURRENCY=2
+WEB_THREADS=4
+GRACEFUL_TIMEOUT=30
+# Serve read endpoints from an in-memory snapshot of the database
+QUESTION_BANK_SNAPSHOT=false
+# Cache serialized read responses until the database file changes (0 disables)
+RESPONSE_CACHE_SIZE=1024
+RESPONSE_CACHE_TTL=300
 EOF
 
-# Run the API server
-python quiz-app-backend.py
+# Run the API server (gunicorn on Linux/macOS, waitress on Windows)
+gunicorn -c gunicorn.conf.py wsgi:app
+# python wsgi.py
+
+# ASGI server for exam windows with many concurrent candidates
+# pip install starlette a2wsgi uvicorn
+# uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+# Development server with the debugger (localhost only)
+# FLASK_DEBUG=true python quiz_app_backend.py
@@ -1,5 +1,6 @@
 # backend/test_api.py
 import os
+import sys
 from dotenv import load_dotenv
 import pytest
 
@@ -34,3 +35,494 @@ def test_stats_endpoint(client):
     resp = client.get("/api/stats")
     assert resp.status_code == 200
     assert "totalQuestions" in resp.get_json()
+
+def test_generate_quiz_endpoint(client):
+    resp = client.post("/api/generate-quiz", json={"topics": ["all"], "length": 5})
+    assert resp.status_code == 200
+    quiz = resp.get_json()["quiz"]
+    assert quiz["total_questions"] == 5
+    for question in quiz["questions"]:
+        assert set(question) == {"id", "question_html", "answer", "topic", "options", "images", "image_urls"}
+        assert question["answer"] is None
+        assert [opt["option_letter"] for opt in question["options"]] == ["A", "B", "C", "D"]
+
+def test_fetch_questions_is_batched():
+    from quiz_app_backend import get_db_connection, fetch_questions
+    conn = get_db_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    questions = fetch_questions(conn, [17, 4, 10])
+    conn.set_trace_callback(None)
+    assert [q["id"] for q in questions] == [17, 4, 10]
+    assert questions[0]["images"] == ["question_17_img_1.png", "question_17_img_2.png"]
+    assert len(statements) == 3
+
+def test_image_responses_are_cacheable(client, tmp_path, monkeypatch):
+    import hashlib
+    import quiz_app_backend
+    data = bytes(range(256)) * 4
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    (tmp_path / f"{digest}.png").write_bytes(data)
+    (tmp_path / "question_1_img_1.png").write_bytes(data)
+    monkeypatch.setattr(quiz_app_backend, "IMAGES_DIR", str(tmp_path))
+
+    assert quiz_app_backend.image_urls([f"{digest}.png", "question_1_img_1.png", "missing.png"]) == [
+        f"/api/images/{digest}.png", f"/api/images/question_1_img_1.png?v={digest}", "/api/images/missing.png"
+    ]
+
+    for url in (f"/api/images/{digest}.png", f"/api/images/question_1_img_1.png?v={digest}"):
+        resp = client.get(url)
+        assert resp.status_code == 200 and resp.data == data
+        assert resp.headers["ETag"] == f'"{digest}"'
+        assert resp.cache_control.immutable and resp.cache_control.max_age == quiz_app_backend.IMAGE_CACHE_MAX_AGE
+
+        resp = client.get(url, headers={"If-None-Match": f'"{digest}"'})
+        assert resp.status_code == 304
+
+        resp = client.get(url, headers={"Range": "bytes=100-199"})
+        assert resp.status_code == 206 and resp.data == data[100:200]
+
+    # Unversioned legacy names have to be revalidated
+    resp = client.get("/api/images/question_1_img_1.png")
+    assert resp.status_code == 200 and not resp.cache_control.immutable and resp.cache_control.no_cache
+    assert client.get("/api/images/missing.png").status_code == 404
+
+def test_image_variants_are_negotiated(client, tmp_path, monkeypatch):
+    import io
+    import json
+    import quiz_app_backend
+    from PIL import Image
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+
+    # A diagram-like image wider than the smaller variant widths
+    img = Image.new("L", (800, 400), 255)
+    for x in range(0, 800, 40):
+        img.paste(0, (x, 0, x + 2, 400))
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    (tmp_path / "images").mkdir()
+    filename = extraction.save_image(buffer.getvalue(), "png", str(tmp_path))
+    (tmp_path / "nuclear_questions.json").write_text(json.dumps([{"id": 1, "images": [filename]}]))
+    manifest = extraction.generate_image_variants(str(tmp_path), widths=(320, 640))
+    assert {v["width"] for v in manifest["images"][filename]["variants"]} >= {320, 640}
+    monkeypatch.setattr(quiz_app_backend, "IMAGES_DIR", str(tmp_path / "images"))
+
+    resp = client.get(f"/api/images/{filename}?w=300", headers={"Accept": "image/webp,*/*"})
+    assert resp.status_code == 200 and resp.mimetype == "image/webp"
+    assert Image.open(io.BytesIO(resp.data)).size == (320, 160)
+    assert "Accept" in resp.headers["Vary"] and resp.cache_control.immutable
+
+    resp = client.get(f"/api/images/{filename}?w=500", headers={"Accept": "image/png,image/*"})
+    assert resp.mimetype == "image/png" and Image.open(io.BytesIO(resp.data)).size == (640, 320)
+    assert client.get(f"/api/images/{filename}?w=500", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+    # Without a width the full size is sent, never larger than the original
+    resp = client.get(f"/api/images/{filename}")
+    assert Image.open(io.BytesIO(resp.data)).size == (800, 400) and len(resp.data) <= len(buffer.getvalue())
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_bulk_questions_endpoint(client, monkeypatch, snapshot):
+    import quiz_app_backend
+    monkeypatch.setattr(quiz_app_backend, "USE_SNAPSHOT", snapshot)
+
+    # Requested order, duplicates dropped, unknown IDs reported
+    resp = client.get("/api/questions?ids=17,5&ids=17,99999999")
+    data = resp.get_json()
+    assert [q["id"] for q in data["questions"]] == [17, 5]
+    assert data["missing"] == [99999999]
+    assert data["questions"][0] == {
+        key: value for key, value in client.get("/api/questions/17").get_json()["question"].items()
+        if key not in ("topic_id", "page_number")
+    }
+    assert client.post("/api/questions", json={"ids": [5, 17]}).get_json()["questions"] == data["questions"][::-1]
+    # Compact JSON, like jsonify
+    assert resp.data.startswith(b'{"success":true,"questions":[{"id":17,') and b'", "' not in resp.data
+    # IDs that aren't integers are reported, not dropped
+    assert client.get("/api/questions?ids=5,x,x,99999999").get_json()["missing"] == [99999999, "x"]
+    assert client.post("/api/questions", json={"ids": [5, "y", None, [1]]}).get_json()["missing"] == ["y", None, [1]]
+    assert client.post("/api/questions", json={}).status_code == 400
+    # Floats and bools aren't truncated to IDs, and IDs beyond SQLite's range are missing
+    data = client.post("/api/questions", json={"ids": [1.9, True, "2", 2**63, -2**63 - 1]}).get_json()
+    assert [q["id"] for q in data["questions"]] == [2]
+    assert data["missing"] == [1.9, True, 2**63, -2**63 - 1]
+    assert client.get(f"/api/questions?ids=5,{2**64}, 5,1e3").get_json()["missing"] == [str(2**64), " 5", "1e3"]
+    monkeypatch.setattr(quiz_app_backend, "MAX_BULK_QUESTIONS", 2)
+    assert client.get("/api/questions?ids=1,2,3").status_code == 400
+    monkeypatch.setattr(quiz_app_backend, "MAX_BULK_QUESTIONS", 1000)
+
+    # Paging through a topic returns each of its questions once, in ID order
+    topic = client.get("/api/topics").get_json()["topics"][0]
+    count = client.get(f"/api/questions/count?topic_id={topic['id']}").get_json()["count"]
+    ids, cursor = [], 0
+    while cursor is not None:
+        page = client.get(f"/api/questions?topic_id={topic['id']}&cursor={cursor}&limit=40").get_json()
+        assert all(q["topic"] == topic["name"] for q in page["questions"])
+        ids += [q["id"] for q in page["questions"]]
+        cursor = page["next_cursor"]
+    assert ids == sorted(set(ids)) and len(ids) == count
+
+    # Pages larger than a chunk are streamed as one JSON document
+    resp = client.get("/api/questions?limit=250")
+    assert resp.is_streamed
+    assert [q["id"] for q in resp.get_json()["questions"]] == sorted(quiz_app_backend.get_topic_index().sample(10**6))[:250]
+    assert client.get("/api/questions?cursor=x").status_code == 400
+    assert client.get(f"/api/questions?cursor={2**64}").status_code == 400
+    assert client.get(f"/api/questions?topic_id={2**64}").status_code == 400
+    assert client.get("/api/questions?limit=1.5").status_code == 400
+    assert client.get(f"/api/questions/count?topic_id={2**64}").get_json()["count"] == 0
+
+def test_snapshot_matches_database(client, monkeypatch):
+    import quiz_app_backend
+    paths = ["/api/topics", "/api/stats", "/api/questions/count?topic_id=1", "/api/questions/17"]
+    from_db = [client.get(path).get_json() for path in paths]
+    monkeypatch.setattr(quiz_app_backend, "USE_SNAPSHOT", True)
+    from_snapshot = [client.get(path).get_json() for path in paths]
+    assert from_snapshot == from_db
+
+    # Image URLs are versioned when the snapshot loads, not per request
+    bank = quiz_app_backend.get_question_bank()
+    qid = next(question.id for question in bank.questions.values() if question.images)
+    expected = client.get(f"/api/questions/{qid}").get_json()["question"]["image_urls"]
+    monkeypatch.setattr(quiz_app_backend, "image_version", lambda filename: pytest.fail("image file read"))
+    assert bank.question_dict(qid)["image_urls"] == expected
+
+def test_snapshot_reloads_when_database_changes(tmp_path, monkeypatch):
+    import shutil
+    import sqlite3
+    import quiz_app_backend
+    db_path = tmp_path / "quiz.db"
+    shutil.copy(quiz_app_backend.DB_PATH, db_path)
+    monkeypatch.setattr(quiz_app_backend, "DB_PATH", str(db_path))
+    monkeypatch.setattr(quiz_app_backend, "SNAPSHOT_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(quiz_app_backend, "_question_bank", None)
+    before = quiz_app_backend.get_question_bank()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM questions WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    after = quiz_app_backend.get_question_bank()
+    assert after is not before
+    assert after.count() == before.count() - 1
+    assert quiz_app_backend.get_question_bank() is after
+
+def test_response_cache_serves_until_database_changes(client, tmp_path, monkeypatch):
+    import shutil
+    import sqlite3
+    import quiz_app_backend
+    db_path = tmp_path / "quiz.db"
+    shutil.copy(quiz_app_backend.DB_PATH, db_path)
+    monkeypatch.setattr(quiz_app_backend, "DB_PATH", str(db_path))
+    monkeypatch.setattr(quiz_app_backend, "_response_cache", quiz_app_backend.ResponseCache(16, 300))
+
+    first = client.get("/api/questions/1")
+    second = client.get("/api/questions/1")
+    assert first.data == second.data and first.headers["ETag"] == second.headers["ETag"]
+    stats = client.get("/api/cache-stats").get_json()["cache"]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    # Clients revalidating an unchanged response get a 304 without a body
+    revalidated = client.get("/api/questions/1", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304 and not revalidated.data
+
+    # Query strings are part of the key, and errors aren't cached
+    assert client.get("/api/questions/count?topic_id=1").get_json() != client.get("/api/questions/count").get_json()
+    assert client.get("/api/questions/99999999").status_code == 404
+    assert client.get("/api/cache-stats").get_json()["cache"]["entries"] == 3
+
+    # A rebuilt database drops every cached response
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE questions SET answer = 'Z' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    changed = client.get("/api/questions/1", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.get_json()["question"]["answer"] == "Z"
+    assert client.get("/api/cache-stats").get_json()["cache"]["invalidations"] == 1
+
+    # With the snapshot, responses follow the loaded bank rather than the file
+    monkeypatch.setattr(quiz_app_backend, "USE_SNAPSHOT", True)
+    monkeypatch.setattr(quiz_app_backend, "SNAPSHOT_CHECK_INTERVAL", 3600)
+    monkeypatch.setattr(quiz_app_backend, "_question_bank", None)
+    assert client.get("/api/questions/1").get_json()["question"]["answer"] == "Z"
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE questions SET answer = 'Y' WHERE id = 1")
+    conn.commit()
+    conn.close()
+    assert client.get("/api/questions/1").get_json()["question"]["answer"] == "Z"
+    monkeypatch.setattr(quiz_app_backend, "_question_bank_checked", 0.0)
+    assert client.get("/api/questions/1").get_json()["question"]["answer"] == "Y"
+
+def test_connection_pool_reuses_read_only_connections(tmp_path):
+    import shutil
+    import sqlite3
+    import threading
+    from quiz_app_backend import DB_PATH, ConnectionPool
+    db_path = tmp_path / "quiz.db"
+    shutil.copy(DB_PATH, db_path)
+    pool = ConnectionPool(str(db_path), health_check_interval=0)
+
+    conn = pool.acquire()
+    assert pool.acquire() is conn
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM questions")
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.acquire()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+    # Replacing the file (as a rebuild does) makes the pool reconnect
+    shutil.copy(DB_PATH, tmp_path / "rebuilt.db")
+    (tmp_path / "rebuilt.db").replace(db_path)
+    assert pool.acquire() is not conn
+    pool.close_all()
+
+def test_pooled_connections_see_a_replaced_database_before_reloading(client, tmp_path, monkeypatch):
+    import shutil
+    import sqlite3
+    import quiz_app_backend
+    db_path = tmp_path / "quiz.db"
+    shutil.copy(quiz_app_backend.DB_PATH, db_path)
+    monkeypatch.setattr(quiz_app_backend, "DB_PATH", str(db_path))
+    monkeypatch.setattr(quiz_app_backend, "DB_POOL_HEALTH_CHECK_INTERVAL", 3600)
+    monkeypatch.setattr(quiz_app_backend, "_db_pool", None)
+    monkeypatch.setattr(quiz_app_backend, "_response_cache", quiz_app_backend.ResponseCache(16, 300))
+    old_conn = quiz_app_backend.get_db_connection()
+    assert client.get("/api/questions/count").get_json()["count"] > 0
+
+    # Rebuild the database without questions and swap it in, as the extractor does
+    shutil.copy(db_path, tmp_path / "rebuilt.db")
+    conn = sqlite3.connect(tmp_path / "rebuilt.db")
+    conn.execute("DELETE FROM questions")
+    conn.commit()
+    conn.close()
+    (tmp_path / "rebuilt.db").replace(db_path)
+
+    # Without a check the pool keeps the old file open until the interval ends...
+    assert quiz_app_backend.get_db_connection() is old_conn
+    # ...but data reloaded for the new file is read from the new file
+    assert not any(quiz_app_backend.get_topic_index().ids.values())
+    assert quiz_app_backend.get_db_connection() is not old_conn
+    assert client.get("/api/questions/count").get_json()["count"] == 0
+    quiz_app_backend.close_db_pool()
+
+def test_generate_quiz_is_reproducible_from_seed(client):
+    body = {"topics": ["3", 5], "length": 10}
+    first = client.post("/api/generate-quiz", json=body).get_json()["quiz"]
+    again = client.post("/api/generate-quiz", json={**body, "seed": first["seed"]}).get_json()["quiz"]
+    ids = [q["id"] for q in first["questions"]]
+    assert ids == [q["id"] for q in again["questions"]]
+    assert len(set(ids)) == 10
+
+def test_topic_index_sample():
+    from quiz_app_backend import TopicIndex
+    index = TopicIndex({1: [10, 11, 12], 2: [20], 3: [30, 31]})
+    assert index.sample(10, [3, 2]) == [20, 30, 31]
+    sample = index.sample(4, seed=7)
+    assert len(set(sample)) == 4 and set(sample) <= {10, 11, 12, 20, 30, 31}
+    assert index.sample(4, seed=7) == sample
+    assert set(index.sample(2, [1, 99], seed=1)) <= {10, 11, 12}
+    assert index.sample(3, [99]) == []
+
+def load_extraction_module():
+    # The extractor (and PyMuPDF) is only needed by the tests that build a
+    # database with it; its own tests are in pdf-extraction/test_extraction.py
+    pytest.importorskip("fitz")
+    import importlib.util
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "pdf-extraction", "pdf-extraction-code.py")
+    spec = importlib.util.spec_from_file_location("pdf_extraction_code", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def built_db(tmp_path, monkeypatch):
+    import json
+    import quiz_app_backend
+    questions_file = os.path.join(
+        os.path.dirname(__file__), "..", "..", "pdf-extraction", "extracted_data", "nuclear_questions.json"
+    )
+    # The extraction script opens its log file in the working directory
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    with open(questions_file, encoding="utf-8") as f:
+        questions = json.load(f)
+    db_path = str(tmp_path / "nuclear_quiz.db")
+    extraction.create_sqlite_database(questions, db_path)
+    monkeypatch.setattr(quiz_app_backend, "DB_PATH", db_path)
+    return db_path
+
+def test_backend_queries_use_indexes(client, built_db):
+    import quiz_app_backend
+    conn = quiz_app_backend.get_db_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    client.get("/api/topics")
+    client.get("/api/stats")
+    client.get("/api/questions/count")
+    client.get("/api/questions/count?topic_id=3")
+    client.get("/api/questions/17")
+    client.get("/api/questions?ids=5,9,17")
+    client.get("/api/questions?topic_id=3&cursor=100&limit=5")
+    client.get("/api/questions?cursor=100&limit=5")
+    client.post("/api/generate-quiz", json={"topics": ["all"], "length": 20})
+    client.post("/api/generate-quiz", json={"topics": ["3", "5"], "length": 5})
+    client.post("/api/submit-answer", json={"question_id": 4, "selected_option": "A"})
+    conn.set_trace_callback(None)
+
+    queries = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT") and sql.strip() != "SELECT 1"]
+    assert queries
+    for sql in queries:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        for step in plan:
+            # Only the small topics and topic_stats tables may be read in full without an index
+            if step.startswith("SCAN") and "COVERING INDEX" not in step:
+                assert step.split()[1] in ("topics", "t", "topic_stats"), f"{step!r} in plan for {sql}"
+
+def test_topic_stats_table_matches_questions(client, built_db, monkeypatch):
+    import sqlite3
+    import quiz_app_backend
+    extraction = load_extraction_module()
+    stats = client.get("/api/stats").get_json()["stats"]
+    assert stats["total_questions"] == sum(topic["question_count"] for topic in stats["topics"])
+
+    # Databases without the table get the same numbers computed on the fly
+    conn = sqlite3.connect(built_db)
+    conn.execute("DROP TABLE topic_stats")
+    conn.commit()
+    fallback = quiz_app_backend.load_topic_stats(conn)
+    conn.close()
+    assert fallback.total == stats["total_questions"]
+    assert list(fallback.topics) == stats["topics"]
+    assert (fallback.with_images, fallback.missing_answers) == (
+        stats["questions_with_images"], stats["questions_missing_answer"]
+    )
+
+    # Incremental updates keep the table current
+    question = client.get("/api/questions/1").get_json()["question"]
+    changed = {
+        "id": 1, "topic": "Brand New Topic", "question_html": question["question_html"],
+        "options": [option["option_html"] for option in question["options"]],
+        "answer": None, "images": [], "page_number": 1
+    }
+    extraction.update_sqlite_database([changed], [], built_db)
+    conn = sqlite3.connect(built_db)
+    assert conn.execute(
+        "SELECT question_count, with_images, missing_answers FROM topic_stats WHERE name = 'Brand New Topic'"
+    ).fetchone() == (1, 0, 1)
+    conn.close()
+    assert client.get("/api/questions/count").get_json()["count"] == stats["total_questions"]
+    new_topic = [t for t in client.get("/api/topics").get_json()["topics"] if t["name"] == "Brand New Topic"][0]
+    assert client.get(f"/api/questions/count?topic_id={new_topic['id']}").get_json()["count"] == 1
+
+def test_create_app_preloads_before_fork(monkeypatch):
+    import quiz_app_backend as backend
+    monkeypatch.setattr(backend, "_topic_index", None)
+    assert backend.create_app() is app
+    assert backend._topic_index is not None
+    # No SQLite connection may be inherited by forked workers
+    assert backend._db_pool is None or not backend._db_pool._connections
+
+    monkeypatch.setattr(backend, "DB_PATH", "missing.db")
+    with pytest.raises(RuntimeError):
+        backend.create_app()
+
+def test_waitress_finishes_accepted_requests_on_sigterm():
+    pytest.importorskip("waitress")
+    import signal
+    import socket
+    import subprocess
+    import threading
+    import time
+    import urllib.request
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # wsgi.py with one thread serving an app whose requests take a second
+    server = subprocess.Popen(
+        [sys.executable, "-c", (
+            "import time, wsgi\n"
+            "def slow(environ, start_response):\n"
+            "    time.sleep(1)\n"
+            "    start_response('200 OK', [('Content-Type', 'text/plain')])\n"
+            "    return [b'done']\n"
+            "wsgi.app = slow\n"
+            "wsgi.serve_waitress()\n"
+        )],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        env={**os.environ, "HOST": "127.0.0.1", "PORT": str(port), "WEB_THREADS": "1", "GRACEFUL_TIMEOUT": "10"}
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/"
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        responses = []
+        requests = [
+            threading.Thread(target=lambda: responses.append(urllib.request.urlopen(url, timeout=20).read()))
+            for _ in range(2)
+        ]
+        for request in requests:
+            request.start()
+        time.sleep(0.3)
+        server.send_signal(signal.SIGTERM)
+        # The running and the queued request are answered, new connections
+        # are refused, and the server exits
+        for request in requests:
+            request.join()
+        assert responses == [b"done", b"done"]
+        with pytest.raises(OSError):
+            urllib.request.urlopen(url, timeout=2)
+        assert server.wait(timeout=20) == 0
+    finally:
+        server.kill()
+
+def test_asgi_app_matches_flask_contracts(client):
+    pytest.importorskip("starlette")
+    pytest.importorskip("a2wsgi")
+    from starlette.testclient import TestClient
+    import asgi
+
+    body = {"topics": ["all"], "length": 5, "seed": 42, "include_answers": True}
+    expected = client.post("/api/generate-quiz", json=body).get_json()
+    with TestClient(asgi.app) as asgi_client:
+        quiz = asgi_client.post("/api/generate-quiz", json=body).json()
+        # The quiz ID is random; the questions follow from the seed
+        assert quiz["quiz"]["questions"] == expected["quiz"]["questions"]
+        assert {**quiz["quiz"], "id": None} == {**expected["quiz"], "id": None}
+
+        question = quiz["quiz"]["questions"][0]
+        answer = {"question_id": question["id"], "selected_option": question["answer"]}
+        assert asgi_client.post("/api/submit-answer", json=answer).json() == (
+            client.post("/api/submit-answer", json=answer).get_json()
+        )
+        assert asgi_client.post("/api/submit-answer", json={}).status_code == 400
+
+        # Other routes are served by the Flask app
+        assert asgi_client.get("/api/health").json() == client.get("/api/health").get_json()
+
+def test_asgi_checks_the_snapshot_off_the_event_loop(monkeypatch):
+    pytest.importorskip("starlette")
+    pytest.importorskip("a2wsgi")
+    import threading
+    import anyio
+    import asgi
+    import quiz_app_backend
+    monkeypatch.setattr(quiz_app_backend, "USE_SNAPSHOT", True)
+    monkeypatch.setattr(asgi, "_db_limiter", None)
+
+    async def calling_thread():
+        return await asgi.run_backend(lambda: (quiz_app_backend.get_question_bank(), threading.get_ident())[1])
+
+    # A fresh snapshot is read on the loop; one due a check is read in a thread
+    monkeypatch.setattr(quiz_app_backend, "SNAPSHOT_CHECK_INTERVAL", 3600)
+    quiz_app_backend.get_question_bank()
+    assert anyio.run(calling_thread) == threading.get_ident()
+    monkeypatch.setattr(quiz_app_backend, "SNAPSHOT_CHECK_INTERVAL", 0)
+    assert anyio.run(calling_thread) != threading.get_ident()
@@ -0,0 +1,517 @@
+"""
+Benchmarks for the quiz API data paths.
+
+Run from the backend directory, e.g.
+
+    python benchmark_api.py quiz-assembly --lengths 10 25 50 100
+    python benchmark_api.py load --workers 1 2 4
+    python benchmark_api.py asgi --clients 50 200 1000
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import quiz_app_backend as backend
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def count_queries(conn):
+    """Install a trace callback on conn and return the list it appends statements to"""
+    statements = []
+    conn.set_trace_callback(statements.append)
+    return statements
+
+def legacy_assemble(conn, question_ids):
+    """The original per-question assembly (three queries per question), kept as a baseline"""
+    quiz_questions = []
+    for qid in question_ids:
+        question = conn.execute(
+            '''
+            SELECT q.id, q.question_html, q.answer, t.name as topic
+            FROM questions q
+            JOIN topics t ON q.topic_id = t.id
+            WHERE q.id = ?
+            ''',
+            (qid,)
+        ).fetchone()
+        options = conn.execute(
+            'SELECT option_letter, option_html FROM options WHERE question_id = ? ORDER BY option_letter',
+            (qid,)
+        ).fetchall()
+        images = conn.execute(
+            'SELECT image_path FROM images WHERE question_id = ?',
+            (qid,)
+        ).fetchall()
+        q_dict = dict(question)
+        q_dict["options"] = [dict(opt) for opt in options]
+        q_dict["images"] = [img["image_path"] for img in images]
+        quiz_questions.append(q_dict)
+    return quiz_questions
+
+def bench_quiz_assembly(args):
+    """Compare query count and latency of legacy vs batched quiz assembly"""
+    conn = backend.get_db_connection()
+    all_ids = [row[0] for row in conn.execute('SELECT id FROM questions')]
+    rng = random.Random(args.seed)
+
+    print(f"{'length':>6} {'path':>8} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for length in args.lengths:
+        for name, assemble in (("legacy", legacy_assemble), ("batched", backend.fetch_questions)):
+            timings = []
+            queries = 0
+            for _ in range(args.iterations):
+                ids = rng.sample(all_ids, min(length, len(all_ids)))
+                statements = count_queries(conn)
+                start = time.perf_counter()
+                assemble(conn, ids)
+                timings.append((time.perf_counter() - start) * 1000)
+                queries = len(statements)
+            conn.set_trace_callback(None)
+            print(f"{length:>6} {name:>8} {queries:>8} "
+                  f"{statistics.median(timings):>8.2f} {percentile(timings, 99):>8.2f}")
+
+def bench_connections(args):
+    """Compare a fresh connection per request against the per-thread pool"""
+    def fresh_connection():
+        conn = sqlite3.connect(backend.DB_PATH)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def run(get_connection, close):
+        def worker():
+            for _ in range(args.requests):
+                conn = get_connection()
+                conn.execute('SELECT id, name FROM topics ORDER BY name').fetchall()
+                conn.execute('SELECT COUNT(*) FROM questions').fetchone()
+                if close:
+                    conn.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return args.threads * args.requests / (time.perf_counter() - start)
+
+    print(f"{args.threads} threads x {args.requests} requests")
+    print(f"connect per request: {run(fresh_connection, True):>10.0f} req/s")
+    print(f"pooled connections:  {run(backend.get_db_connection, False):>10.0f} req/s")
+    backend.close_db_pool()
+
+def bench_sampling(args):
+    """Compare selecting every matching ID + random.sample against the topic index"""
+    conn = backend.get_db_connection()
+    index = backend.get_topic_index()
+
+    def legacy_sample(k):
+        ids = [row['id'] for row in conn.execute(
+            'SELECT q.id FROM questions q JOIN topics t ON q.topic_id = t.id'
+        )]
+        return ids if len(ids) <= k else random.sample(ids, k)
+
+    print(f"{'length':>6} {'path':>8} {'p50 us':>8} {'p99 us':>8}")
+    for length in args.lengths:
+        for name, sample in (("legacy", legacy_sample), ("index", index.sample)):
+            timings = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                sample(length)
+                timings.append((time.perf_counter() - start) * 1e6)
+            print(f"{length:>6} {name:>8} {statistics.median(timings):>8.1f} {percentile(timings, 99):>8.1f}")
+
+def bench_topic_stats(args):
+    """Stats and per-topic counts: the original GROUP BY/COUNT queries vs the topic_stats summary"""
+    conn = backend.get_db_connection()
+    topic_ids = [row[0] for row in conn.execute('SELECT id FROM topics')]
+
+    def legacy_stats():
+        conn.execute('SELECT COUNT(*) FROM questions').fetchone()
+        conn.execute('''
+            SELECT t.name, COUNT(q.id) as question_count
+            FROM topics t
+            LEFT JOIN questions q ON t.id = q.topic_id
+            GROUP BY t.id
+            ORDER BY question_count DESC
+        ''').fetchall()
+        for topic_id in topic_ids:
+            conn.execute('SELECT COUNT(*) FROM questions WHERE topic_id = ?', (topic_id,)).fetchone()
+
+    def summary_reload():
+        stats = backend.load_topic_stats(conn)
+        for topic_id in topic_ids:
+            stats.counts.get(topic_id, 0)
+
+    def summary_cached():
+        stats = backend.get_topic_stats()
+        for topic_id in topic_ids:
+            stats.counts.get(topic_id, 0)
+
+    # Databases built before topic_stats existed are read with the fallback query
+    has_summary = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'topic_stats'"
+    ).fetchone() is not None
+    print(f"stats + {len(topic_ids)} topic counts per iteration")
+    print(f"{'path':>15} {'p50 us':>8} {'p99 us':>8}")
+    for name, run in (
+        ("legacy", legacy_stats),
+        ("summary table" if has_summary else "fallback query", summary_reload),
+        ("in memory", summary_cached)
+    ):
+        timings = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1e6)
+        print(f"{name:>15} {statistics.median(timings):>8.1f} {percentile(timings, 99):>8.1f}")
+
+def bench_bulk_questions(args):
+    """Fetching a quiz's worth of questions: one request per question vs one /api/questions request"""
+    conn = backend.get_db_connection()
+    all_ids = [row[0] for row in conn.execute('SELECT id FROM questions')]
+    rng = random.Random(args.seed)
+    client = backend.app.test_client()
+    backend._response_cache = backend.ResponseCache(0, 0)  # measure the queries, not the cache
+
+    print(f"{'questions':>9} {'path':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for count in args.counts:
+        for name, fetch in (
+            ("per-id", lambda ids: [client.get(f'/api/questions/{qid}') for qid in ids]),
+            ("bulk", lambda ids: client.get(f"/api/questions?ids={','.join(map(str, ids))}").get_data()),
+        ):
+            timings = []
+            for _ in range(args.iterations):
+                ids = rng.sample(all_ids, min(count, len(all_ids)))
+                start = time.perf_counter()
+                fetch(ids)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{count:>9} {name:>10} {statistics.median(timings):>8.2f} {percentile(timings, 99):>8.2f}")
+
+def bench_response_cache(args):
+    """Per-request time of the cached read endpoints, with the response cache off and on"""
+    conn = backend.get_db_connection()
+    all_ids = [row[0] for row in conn.execute('SELECT id FROM questions')]
+    topic_ids = [row[0] for row in conn.execute('SELECT id FROM topics')]
+    rng = random.Random(args.seed)
+    client = backend.app.test_client()
+    paths = {
+        "topics": lambda: '/api/topics',
+        "stats": lambda: '/api/stats',
+        "count": lambda: f'/api/questions/count?topic_id={rng.choice(topic_ids)}',
+        "question": lambda: f'/api/questions/{rng.choice(all_ids)}',
+    }
+
+    print(f"{'endpoint':>9} {'cache':>6} {'p50 us':>8} {'p99 us':>8}")
+    for name, path in paths.items():
+        for label, size in (("off", 0), ("on", len(all_ids) + len(topic_ids) + 8)):
+            backend._response_cache = backend.ResponseCache(size, backend.RESPONSE_CACHE_TTL)
+            for _ in range(args.iterations):  # warm up (and fill the cache)
+                client.get(path())
+            timings = []
+            for _ in range(args.iterations):
+                url = path()
+                start = time.perf_counter()
+                client.get(url)
+                timings.append((time.perf_counter() - start) * 1e6)
+            print(f"{name:>9} {label:>6} {statistics.median(timings):>8.0f} {percentile(timings, 99):>8.0f}")
+    print(f"hit/miss counters of the last run: {backend._response_cache.stats()}")
+
+def load_request_mix(all_ids, rng):
+    """The requests a load test client sends: (method, path, body), read-heavy like the frontend"""
+    question_id = rng.choice(all_ids)
+    return rng.choice((
+        ('GET', '/api/topics', None),
+        ('GET', '/api/questions/count', None),
+        ('GET', f'/api/questions/{question_id}', None),
+        ('POST', '/api/generate-quiz', json.dumps({"topics": ["all"], "length": 10})),
+        ('POST', '/api/submit-answer', json.dumps({"question_id": question_id, "selected_option": "A"})),
+    ))
+
+def drive_load(host, port, clients, duration, all_ids, seed):
+    """
+    Send requests from clients threads, each over one keep-alive connection,
+    for duration seconds. Returns (requests per second, latencies in ms, errors).
+    """
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client(client_seed):
+        rng = random.Random(client_seed)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        samples = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            method, path, body = load_request_mix(all_ids, rng)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body, {'Content-Type': 'application/json'} if body else {})
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        latencies.extend(samples)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(seed + n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies) / (time.perf_counter() - start), latencies, sum(errors)
+
+def wait_for_server(host, port, process, timeout=30):
+    """Wait until the server answers /api/health"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+def free_port():
+    """A TCP port nothing is listening on"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def bench_load(args):
+    """
+    Throughput ceiling of the production server per worker count.
+
+    For each --workers count a gunicorn server is started with
+    gunicorn.conf.py and driven at each --clients level; the highest
+    throughput reached is its ceiling. With --url an already running server
+    is driven instead. The clients are threads of this process, so on a
+    small machine the driver competes with the server for CPU.
+    """
+    conn = backend.get_db_connection()
+    all_ids = [row[0] for row in conn.execute('SELECT id FROM questions')]
+    backend.close_db_pool()
+
+    def run_levels(host, port):
+        ceiling = 0
+        for clients in args.clients:
+            throughput, latencies, errors = drive_load(host, port, clients, args.duration, all_ids, args.seed)
+            ceiling = max(ceiling, throughput)
+            print(f"{clients:>8} {throughput:>8.0f} {statistics.median(latencies):>8.2f} "
+                  f"{percentile(latencies, 99):>8.2f} {errors:>7}")
+        return ceiling
+
+    header = f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    if args.url:
+        host, _, port = args.url.rpartition('//')[2].partition(':')
+        print(header)
+        print(f"ceiling: {run_levels(host, int(port or 80)):.0f} req/s")
+        return
+
+    ceilings = []
+    for workers in args.workers:
+        port = free_port()
+        # MAX_REQUESTS=0: a worker recycled mid-run would drop every open connection
+        env = dict(os.environ, HOST='127.0.0.1', PORT=str(port), WEB_CONCURRENCY=str(workers),
+                   WEB_THREADS=str(args.threads), MAX_REQUESTS='0', DB_PATH=os.path.abspath(backend.DB_PATH))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_server('127.0.0.1', port, server)
+            print(f"gunicorn, {workers} workers x {args.threads} threads")
+            print(header)
+            ceilings.append((workers, run_levels('127.0.0.1', port)))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'workers':>8} {'ceiling':>8} {'/worker':>8}")
+    for workers, ceiling in ceilings:
+        print(f"{workers:>8} {ceiling:>8.0f} {ceiling / workers:>8.0f}")
+
+def exam_request_mix(all_ids, rng):
+    """An exam-window request: candidates mostly start quizzes and submit answers"""
+    if rng.random() < 0.2:
+        return 'POST', '/api/generate-quiz', json.dumps({"topics": ["all"], "length": 25})
+    return 'POST', '/api/submit-answer', json.dumps(
+        {"question_id": rng.choice(all_ids), "selected_option": rng.choice("ABCD")}
+    )
+
+async def async_client(host, port, deadline, all_ids, rng, latencies):
+    """
+    One keep-alive HTTP/1.1 client sending exam requests until deadline.
+    Returns the number of failed requests.
+    """
+    loop = asyncio.get_running_loop()
+    reader = writer = None
+    failed = 0
+    while loop.time() < deadline:
+        method, path, body = exam_request_mix(all_ids, rng)
+        body = body.encode()
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            status = int((await reader.readline()).split()[1])
+            length = None
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            if status >= 500:
+                failed += 1
+        except (OSError, ValueError, IndexError, TypeError, asyncio.IncompleteReadError):
+            failed += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+    if writer is not None:
+        writer.close()
+    return failed
+
+async def drive_async_load(host, port, clients, duration, all_ids, seed):
+    """Like drive_load, but with clients coroutines so thousands of clients fit in one process"""
+    latencies = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    start = time.perf_counter()
+    errors = await asyncio.gather(*(
+        async_client(host, port, deadline, all_ids, random.Random(seed + n), latencies)
+        for n in range(clients)
+    ))
+    return len(latencies) / (time.perf_counter() - start), latencies, sum(errors)
+
+def bench_asgi(args):
+    """
+    Exam-window load on the Flask app (gunicorn, wsgi.py) and the ASGI app
+    (uvicorn, asgi.py), each with --workers processes, at each --clients level.
+    """
+    conn = backend.get_db_connection()
+    all_ids = [row[0] for row in conn.execute('SELECT id FROM questions')]
+    backend.close_db_pool()
+
+    servers = (
+        ("wsgi", [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']),
+        ("asgi", [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                  '--workers', str(args.workers), '--no-access-log', '--log-level', 'warning']),
+    )
+    print(f"{args.workers} workers, snapshot {'on' if backend.USE_SNAPSHOT else 'off'}")
+    print(f"{'server':>6} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, command in servers:
+        port = free_port()
+        env = dict(os.environ, HOST='127.0.0.1', PORT=str(port), WEB_CONCURRENCY=str(args.workers),
+                   WEB_THREADS=str(args.threads), DB_THREADS=str(args.threads), MAX_REQUESTS='0',
+                   DB_PATH=os.path.abspath(backend.DB_PATH))
+        server = subprocess.Popen(
+            command + (['--port', str(port)] if name == "asgi" else []),
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for_server('127.0.0.1', port, server)
+            for clients in args.clients:
+                throughput, latencies, errors = asyncio.run(
+                    drive_async_load('127.0.0.1', port, clients, args.duration, all_ids, args.seed)
+                )
+                print(f"{name:>6} {clients:>8} {throughput:>8.0f} {percentile(latencies, 50):>8.2f} "
+                      f"{percentile(latencies, 99):>8.2f} {errors:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the quiz API data paths")
+    parser.add_argument("--db-path", default=backend.DB_PATH, help="Path to the SQLite database")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for question sampling")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    quiz = subparsers.add_parser("quiz-assembly", help="Legacy vs batched quiz assembly")
+    quiz.add_argument("--lengths", type=int, nargs="+", default=[10, 25, 50, 100])
+    quiz.add_argument("--iterations", type=int, default=200)
+    quiz.set_defaults(func=bench_quiz_assembly)
+
+    sampling = subparsers.add_parser("sampling", help="Full ID scan vs topic index sampling")
+    sampling.add_argument("--lengths", type=int, nargs="+", default=[10, 25, 50, 100])
+    sampling.add_argument("--iterations", type=int, default=500)
+    sampling.set_defaults(func=bench_sampling)
+
+    connections = subparsers.add_parser("connections", help="Connect per request vs pooled connections")
+    connections.add_argument("--threads", type=int, default=8)
+    connections.add_argument("--requests", type=int, default=500)
+    connections.set_defaults(func=bench_connections)
+
+    stats = subparsers.add_parser("topic-stats", help="GROUP BY/COUNT queries vs the topic_stats summary")
+    stats.add_argument("--iterations", type=int, default=500)
+    stats.set_defaults(func=bench_topic_stats)
+
+    bulk = subparsers.add_parser("bulk-questions", help="Per-ID question requests vs one bulk request")
+    bulk.add_argument("--counts", type=int, nargs="+", default=[10, 50, 200])
+    bulk.add_argument("--iterations", type=int, default=50)
+    bulk.set_defaults(func=bench_bulk_questions)
+
+    cache = subparsers.add_parser("response-cache", help="Read endpoints with the response cache off vs on")
+    cache.add_argument("--iterations", type=int, default=2000)
+    cache.set_defaults(func=bench_response_cache)
+
+    load = subparsers.add_parser("load", help="HTTP throughput ceiling of the gunicorn server per worker count")
+    load.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="gunicorn worker counts to try")
+    load.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker")
+    load.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 32],
+                      help="Concurrent keep-alive clients to drive each server with")
+    load.add_argument("--duration", type=float, default=10, help="Seconds per client level")
+    load.add_argument("--url", help="Drive an already running server (e.g. http://127.0.0.1:5000) instead")
+    load.set_defaults(func=bench_load)
+
+    asgi = subparsers.add_parser("asgi", help="Exam-window load, Flask (gunicorn) vs ASGI (uvicorn)")
+    asgi.add_argument("--workers", type=int, default=1, help="Server processes for both servers")
+    asgi.add_argument("--threads", type=int, default=16,
+                      help="gunicorn threads per worker, and the ASGI app's database threads")
+    asgi.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000],
+                      help="Concurrent keep-alive clients")
+    asgi.add_argument("--duration", type=float, default=10, help="Seconds per client level")
+    asgi.set_defaults(func=bench_asgi)
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db_path):
+        parser.error(f"Database not found at {args.db_path}")
+    backend.DB_PATH = args.db_path
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+gunicorn settings for the quiz API, read from the environment:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is loaded once in the master (preload_app) and forked into the
+workers, which share the loaded topic index and question bank snapshot
+copy-on-write. Requests are read-only SQLite queries, so several threads per
+worker keep each process busy while others wait on the database.
+"""
+import multiprocessing
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+
+# On SIGTERM workers stop accepting and get this long to finish running requests
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't build up
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('ACCESS_LOG')  # e.g. '-' for stdout
+
+def worker_exit(server, worker):
+    """Close the worker's pooled database connections"""
+    import quiz_app_backend
+    quiz_app_backend.close_db_pool()
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, make_response, send_from_directory, stream_with_context, abort
 from flask_cors import CORS
 import sqlite3
 import os
@@ -7,6 +7,20 @@ load_dotenv()
 import random
 import json
 import logging
+import atexit
+import hashlib
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from itertools import accumulate
+from types import MappingProxyType
+from urllib.parse import quote
+from urllib.request import pathname2url
+from werkzeug.security import safe_join
 
 # Set up logging
 logging.basicConfig(
@@ -24,25 +38,772 @@ CORS(app)  # Enable CORS for all routes
 # Configuration
 DB_PATH = os.environ.get('DB_PATH', '../pdf-extraction/extracted_data/nuclear_quiz.db')
 IMAGES_DIR = os.environ.get('IMAGES_DIR', '../pdf-extraction/extracted_data/images')
+IMAGE_URL_PREFIX = os.environ.get('IMAGE_URL_PREFIX', '/api/images/')  # e.g. a CDN in front of the API
+IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', 365 * 24 * 3600))
+USE_SNAPSHOT = os.environ.get('QUESTION_BANK_SNAPSHOT', 'false').lower() in ('1', 'true', 'yes')
+SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('SNAPSHOT_CHECK_INTERVAL', 2))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024))
+DB_CACHE_SIZE = int(os.environ.get('DB_CACHE_SIZE', -16000))  # negative = KiB
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))  # responses, 0 disables the cache
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+MAX_BULK_QUESTIONS = int(os.environ.get('MAX_BULK_QUESTIONS', 1000))  # per /api/questions request
+QUESTIONS_PAGE_SIZE = int(os.environ.get('QUESTIONS_PAGE_SIZE', 50))
 
-def get_db_connection():
-    """Create a connection to the SQLite database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-    return conn
+class ConnectionPool:
+    """
+    Per-thread pool of read-only SQLite connections.
+    
+    Each thread (request worker) opens one connection the first time it needs
+    it and reuses it for later requests, so the open, schema parse and page
+    cache warm-up are paid once per thread instead of once per request.
+    Connections are health-checked every health_check_interval seconds and
+    reopened if they fail or the database file was replaced on disk.
+    """
+    
+    def __init__(self, db_path, health_check_interval=30):
+        self.db_path = db_path
+        self.health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._connections = {}  # thread ident -> connection
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+    
+    def _open(self):
+        """Open a read-only connection with the serving pragmas applied"""
+        uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+        # Connections never leave their thread, but close_all() may run on another one
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        conn.execute('PRAGMA query_only = ON')
+        conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+        conn.execute(f'PRAGMA cache_size = {DB_CACHE_SIZE}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        
+        self._local.conn = conn
+        self._local.file_id = self._file_id()
+        self._local.checked = time.monotonic()
+        
+        with self._lock:
+            self._prune_dead_threads()
+            self._connections[threading.get_ident()] = conn
+        return conn
+    
+    def _file_id(self):
+        """Identify the database file, so a replaced file can be detected"""
+        stat = os.stat(self.db_path)
+        return (stat.st_dev, stat.st_ino)
+    
+    def _is_healthy(self, conn):
+        """Check that conn still works and still points at the current database file"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return self._local.file_id == self._file_id()
+        except (sqlite3.Error, OSError):
+            return False
+    
+    def _prune_dead_threads(self):
+        """Close connections owned by threads that have exited"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._connections if ident not in alive]:
+            self._connections.pop(ident).close()
+    
+    def _discard(self, conn):
+        """Close and forget the current thread's connection"""
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+        self._local.conn = None
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    
+    def acquire(self, verify=False):
+        """
+        Return the calling thread's connection, opening or replacing it if needed.
+        
+        verify=True health-checks it now instead of waiting for the interval,
+        for callers that must see a database file that was just replaced.
+        """
+        if os.getpid() != self._pid:
+            # Connections must not be shared across fork(); start over in the child
+            self._local = threading.local()
+            self._connections = {}
+            self._pid = os.getpid()
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return self._open()
+        
+        if verify or time.monotonic() - self._local.checked >= self.health_check_interval:
+            if not self._is_healthy(conn):
+                logging.info("Reopening stale database connection")
+                self._discard(conn)
+                return self._open()
+            self._local.checked = time.monotonic()
+        return conn
+    
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = {}
+        self._local = threading.local()
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_connection(verify=False):
+    """
+    Get the calling thread's pooled connection to the SQLite database.
+    
+    The connection is owned by the pool and stays open after the request;
+    callers must not close it. See ConnectionPool.acquire for verify.
+    """
+    global _db_pool
+    pool = _db_pool
+    if pool is None or pool.db_path != DB_PATH:
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool.db_path != DB_PATH:
+                if _db_pool is not None:
+                    _db_pool.close_all()
+                _db_pool = ConnectionPool(DB_PATH, DB_POOL_HEALTH_CHECK_INTERVAL)
+            pool = _db_pool
+    return pool.acquire(verify)
+
+def close_db_pool():
+    """Close all pooled database connections (on shutdown)"""
+    if _db_pool is not None:
+        _db_pool.close_all()
+
+atexit.register(close_db_pool)
+
+# SQLite limits the number of bound parameters per statement, so large ID
+# lists are fetched in chunks of this size
+MAX_QUERY_PARAMS = 500
+
+def fetch_questions(conn, question_ids):
+    """
+    Fetch questions with their options and images for a list of IDs.
+    
+    Uses one set-based query per table (per chunk of IDs) instead of three
+    queries per question, and returns the questions in the order of
+    question_ids. IDs that don't exist are skipped.
+    """
+    questions = {}
+    options = {}
+    images = {}
+    
+    for start in range(0, len(question_ids), MAX_QUERY_PARAMS):
+        chunk = question_ids[start:start + MAX_QUERY_PARAMS]
+        placeholders = ','.join('?' for _ in chunk)
+        
+        # Get questions
+        for row in conn.execute(
+            f'''
+            SELECT q.id, q.question_html, q.answer, t.name as topic
+            FROM questions q
+            JOIN topics t ON q.topic_id = t.id
+            WHERE q.id IN ({placeholders})
+            ''',
+            chunk
+        ):
+            questions[row['id']] = dict(row)
+        
+        # Get options
+        for row in conn.execute(
+            f'''
+            SELECT question_id, option_letter, option_html
+            FROM options
+            WHERE question_id IN ({placeholders})
+            ORDER BY question_id, option_letter
+            ''',
+            chunk
+        ):
+            options.setdefault(row['question_id'], []).append({
+                "option_letter": row['option_letter'],
+                "option_html": row['option_html']
+            })
+        
+        # Get images
+        for row in conn.execute(
+            f'''
+            SELECT question_id, image_path
+            FROM images
+            WHERE question_id IN ({placeholders})
+            ORDER BY question_id, id
+            ''',
+            chunk
+        ):
+            images.setdefault(row['question_id'], []).append(row['image_path'])
+    
+    # Assemble the payload in the requested order
+    result = []
+    for qid in question_ids:
+        question = questions.get(qid)
+        if question is None:
+            continue
+        question["options"] = options.get(qid, [])
+        question["images"] = images.get(qid, [])
+        question["image_urls"] = image_urls(question["images"])
+        result.append(question)
+    
+    return result
+
+# In-memory question bank snapshot
+#
+# When QUESTION_BANK_SNAPSHOT is enabled the read endpoints are served from an
+# immutable copy of the database held in RAM. The snapshot is rebuilt and
+# swapped in when the database file changes on disk.
+
+Question = namedtuple(
+    'Question',
+    ['id', 'question_html', 'answer', 'topic', 'topic_id', 'page_number', 'options', 'images', 'image_urls']
+)
+
+class QuestionBank:
+    """Immutable in-memory copy of the topics, questions, options and images tables"""
+    
+    def __init__(self, topics, questions, signature, content_hash):
+        # topics: tuple of (id, name) sorted by name
+        self.topics = tuple(topics)
+        # questions: read-only mapping of question id -> Question
+        self.questions = MappingProxyType(dict(questions))
+        self.question_ids = tuple(sorted(self.questions))
+        topic_question_ids = {topic_id: [] for topic_id, _ in self.topics}
+        for qid in self.question_ids:
+            topic_question_ids[self.questions[qid].topic_id].append(qid)
+        self.topic_index = TopicIndex(topic_question_ids)
+        self.with_images = sum(1 for question in self.questions.values() if question.images)
+        self.missing_answers = sum(1 for question in self.questions.values() if not question.answer)
+        self.signature = signature
+        self.content_hash = content_hash
+    
+    def count(self, topic_id=None):
+        """Count questions, optionally restricted to one topic"""
+        if topic_id is None:
+            return len(self.question_ids)
+        return self.topic_index.count(topic_id)
+    
+    def question_dict(self, question_id, detail=False):
+        """Return a question in the same shape as the SQL-backed endpoints"""
+        question = self.questions.get(question_id)
+        if question is None:
+            return None
+        q_dict = {
+            "id": question.id,
+            "question_html": question.question_html,
+            "answer": question.answer,
+            "topic": question.topic
+        }
+        if detail:
+            q_dict["topic_id"] = question.topic_id
+            q_dict["page_number"] = question.page_number
+        q_dict["options"] = [
+            {"option_letter": letter, "option_html": option_html}
+            for letter, option_html in question.options
+        ]
+        q_dict["images"] = list(question.images)
+        q_dict["image_urls"] = list(question.image_urls)
+        return q_dict
+    
+    def topic_stats(self):
+        """Return per-topic question counts, largest first"""
+        stats = [
+            {"name": name, "question_count": self.count(topic_id)}
+            for topic_id, name in sorted(self.topics)
+        ]
+        stats.sort(key=lambda stat: stat["question_count"], reverse=True)
+        return stats
+
+def db_file_signature(db_path):
+    """Cheap change detector for the database file: (mtime_ns, size)"""
+    stat = os.stat(db_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def db_file_hash(db_path):
+    """SHA-256 of the database file contents"""
+    digest = hashlib.sha256()
+    with open(db_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TopicIndex:
+    """
+    Question IDs grouped by topic, for sampling quizzes in O(k).
+    
+    Each topic's IDs are kept in a compact array, and the topics are laid out
+    one after another with prefix counts, so the union of any set of topics
+    can be addressed as positions 0..N-1. A uniform sample of k questions is
+    k random positions mapped back to (topic, offset) with a binary search
+    over the prefix counts; no list of all matching IDs is ever built.
+    """
+    
+    def __init__(self, topic_question_ids, signature=None):
+        self.topic_ids = tuple(sorted(topic_question_ids))
+        self.ids = {
+            topic_id: array('q', sorted(topic_question_ids[topic_id]))
+            for topic_id in self.topic_ids
+        }
+        self.all_prefix = list(accumulate(len(self.ids[t]) for t in self.topic_ids))
+        self.signature = signature
+    
+    def count(self, topic_id):
+        """Number of questions in a topic"""
+        ids = self.ids.get(topic_id)
+        return len(ids) if ids is not None else 0
+    
+    def sample(self, k, topic_ids=None, seed=None):
+        """
+        Pick up to k distinct question IDs uniformly from the given topics.
+        
+        topic_ids=None means all topics. The same seed, topics and k give the
+        same IDs in the same order for the same database. If the topics hold
+        k questions or fewer, all of them are returned in ID order.
+        """
+        if topic_ids is None:
+            topics = self.topic_ids
+            prefix = self.all_prefix
+        else:
+            topics = tuple(sorted(set(topic_ids) & self.ids.keys()))
+            prefix = list(accumulate(len(self.ids[t]) for t in topics))
+        
+        total = prefix[-1] if prefix else 0
+        if total <= k:
+            positions = range(total)
+        else:
+            # random.sample over a range draws k positions without building it
+            positions = random.Random(seed).sample(range(total), k)
+        
+        selected_ids = []
+        for position in positions:
+            topic_pos = bisect_right(prefix, position)
+            offset = position - (prefix[topic_pos - 1] if topic_pos else 0)
+            selected_ids.append(self.ids[topics[topic_pos]][offset])
+        return selected_ids
+
+def load_topic_index(conn, signature=None):
+    """Build a TopicIndex from the questions table"""
+    topic_question_ids = {}
+    for topic_id, question_id in conn.execute(
+        '''
+        SELECT q.topic_id, q.id
+        FROM questions q
+        JOIN topics t ON q.topic_id = t.id
+        ORDER BY q.topic_id, q.id
+        '''
+    ):
+        topic_question_ids.setdefault(topic_id, []).append(question_id)
+    return TopicIndex(topic_question_ids, signature)
+
+_topic_index = None
+
+def get_topic_index():
+    """Return the topic index for the database, rebuilding it when the file changes"""
+    global _topic_index
+    signature = (DB_PATH, db_file_signature(DB_PATH))
+    index = _topic_index
+    if index is None or index.signature != signature:
+        index = load_topic_index(get_db_connection(verify=True), signature)
+        _topic_index = index
+    return index
+
+TopicStats = namedtuple(
+    'TopicStats',
+    ['total', 'with_images', 'missing_answers', 'topics', 'counts', 'signature']
+)
+
+def load_topic_stats(conn, signature=None):
+    """
+    Read the per-topic counts into a TopicStats.
+    
+    The extractor keeps them in the topic_stats table; databases built
+    before it existed get the same numbers computed from the questions.
+    """
+    try:
+        rows = conn.execute(
+            'SELECT topic_id, name, question_count, with_images, missing_answers FROM topic_stats'
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = conn.execute('''
+            SELECT t.id, t.name, COUNT(DISTINCT q.id), COUNT(DISTINCT i.question_id),
+                   COUNT(DISTINCT CASE WHEN COALESCE(q.answer, '') = '' THEN q.id END)
+            FROM topics t
+            LEFT JOIN questions q ON t.id = q.topic_id
+            LEFT JOIN images i ON i.question_id = q.id
+            GROUP BY t.id
+        ''').fetchall()
+    
+    # Largest topics first, as the stats endpoint has always listed them
+    rows = sorted((tuple(row) for row in rows), key=lambda row: (-row[2], row[0]))
+    return TopicStats(
+        total=sum(row[2] for row in rows),
+        with_images=sum(row[3] for row in rows),
+        missing_answers=sum(row[4] for row in rows),
+        topics=tuple({"name": row[1], "question_count": row[2]} for row in rows),
+        counts={row[0]: row[2] for row in rows},
+        signature=signature
+    )
+
+_topic_stats = None
+
+def get_topic_stats():
+    """Return the topic counts for the database, reloading them when the file changes"""
+    global _topic_stats
+    signature = (DB_PATH, db_file_signature(DB_PATH))
+    stats = _topic_stats
+    if stats is None or stats.signature != signature:
+        stats = load_topic_stats(get_db_connection(verify=True), signature)
+        _topic_stats = stats
+    return stats
+
+def load_question_bank(db_path, signature=None, content_hash=None):
+    """Read the whole question bank from SQLite into a QuestionBank"""
+    conn = sqlite3.connect(db_path)
+    try:
+        topics = conn.execute('SELECT id, name FROM topics ORDER BY name').fetchall()
+        
+        options = {}
+        for question_id, letter, option_html in conn.execute(
+            'SELECT question_id, option_letter, option_html FROM options ORDER BY question_id, option_letter'
+        ):
+            options.setdefault(question_id, []).append((letter, option_html))
+        
+        images = {}
+        for question_id, image_path in conn.execute(
+            'SELECT question_id, image_path FROM images ORDER BY question_id, id'
+        ):
+            images.setdefault(question_id, []).append(image_path)
+        
+        questions = {}
+        for row in conn.execute(
+            '''
+            SELECT q.id, q.question_html, q.answer, t.name, t.id, q.page_number
+            FROM questions q
+            JOIN topics t ON q.topic_id = t.id
+            '''
+        ):
+            qid = row[0]
+            question_images = tuple(images.get(qid, ()))
+            questions[qid] = Question(
+                *row,
+                options=tuple(options.get(qid, ())),
+                images=question_images,
+                # Versioning legacy-named images stats and hashes their files,
+                # so it's done here rather than on every (possibly async) request
+                image_urls=tuple(image_urls(question_images))
+            )
+    finally:
+        conn.close()
+    
+    return QuestionBank(topics, questions, signature, content_hash)
+
+_question_bank = None
+_question_bank_checked = 0.0
+_question_bank_lock = threading.Lock()
+
+def question_bank_is_fresh():
+    """Whether get_question_bank() will return the loaded snapshot without checking the database file"""
+    return _question_bank is not None and time.monotonic() - _question_bank_checked < SNAPSHOT_CHECK_INTERVAL
+
+def get_question_bank():
+    """
+    Return the current question bank snapshot, reloading it if the database changed.
+    
+    The file's mtime/size is checked at most every SNAPSHOT_CHECK_INTERVAL
+    seconds; when it differs the contents are hashed and the snapshot is only
+    rebuilt if the hash changed. The new snapshot replaces the old one in a
+    single assignment, so requests always see a complete bank.
+    """
+    global _question_bank, _question_bank_checked
+    
+    bank = _question_bank
+    if question_bank_is_fresh():
+        return bank
+    
+    with _question_bank_lock:
+        bank = _question_bank
+        if question_bank_is_fresh():
+            return bank
+        
+        try:
+            signature = db_file_signature(DB_PATH)
+            if bank is None or signature != bank.signature:
+                content_hash = db_file_hash(DB_PATH)
+                if bank is None or content_hash != bank.content_hash:
+                    bank = load_question_bank(DB_PATH, signature, content_hash)
+                    logging.info(f"Loaded question bank snapshot ({bank.count()} questions, hash {content_hash[:12]})")
+                else:
+                    bank = QuestionBank(bank.topics, bank.questions, signature, content_hash)
+                _question_bank = bank
+        except Exception as e:
+            # Keep serving the previous snapshot if the new file can't be read yet
+            if bank is None:
+                raise
+            logging.error(f"Failed to reload question bank snapshot: {str(e)}")
+        
+        _question_bank_checked = time.monotonic()
+        return bank
+
+# SQLite's INTEGER range; larger ints can't be bound as query parameters
+MIN_SQLITE_INT, MAX_SQLITE_INT = -2**63, 2**63 - 1
+DECIMAL_INT = re.compile(r'-?[0-9]+')
+
+def parse_id(value):
+    """
+    Convert an ID from a request to an int, or None if it isn't one.
+    
+    Only ints (not bools) and strings of decimal digits within SQLite's
+    INTEGER range are accepted, so 1.9 or True aren't taken as 1.
+    """
+    if isinstance(value, str) and DECIMAL_INT.fullmatch(value):
+        value = int(value)
+    elif not isinstance(value, int) or isinstance(value, bool):
+        return None
+    return value if MIN_SQLITE_INT <= value <= MAX_SQLITE_INT else None
+
+def parse_ids(values):
+    """Convert IDs from a request to ints, dropping anything that isn't one"""
+    return [id for id in map(parse_id, values) if id is not None]
+
+# Response cache
+#
+# The read-only endpoints only change when the extractor rebuilds the
+# database, so their serialized JSON is cached per route and query string.
+# Entries are tagged with the database file's signature (or the question
+# bank snapshot's hash) and the whole cache is dropped when it changes; the
+# TTL bounds how long an entry can outlive a change the signature misses
+# (e.g. a rewrite within the mtime resolution).
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'expires'])
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized responses with a TTL and hit/miss counters"""
+    
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, version):
+        """The live entry for key under this database version, or None"""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+    
+    def put(self, key, version, body):
+        """Store a response body, evicting the least recently used entries"""
+        entry = CachedResponse(body, hashlib.sha256(body).hexdigest()[:32], time.monotonic() + self.ttl)
+        with self._lock:
+            if version == self.version and self.max_entries > 0:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+_response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+def cached_response(view):
+    """
+    Serve a read-only JSON view from the response cache.
+    
+    Successful responses are cached as bytes keyed by path and query
+    string, and sent with an ETag of their content, so clients revalidating
+    with If-None-Match get a 304 without a body. Errors are never cached.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            # Snapshot views answer from the loaded bank, which can lag the
+            # file by SNAPSHOT_CHECK_INTERVAL, so their responses are tagged
+            # with the bank they were built from
+            if USE_SNAPSHOT:
+                version = (DB_PATH, USE_SNAPSHOT, get_question_bank().content_hash)
+            else:
+                version = (DB_PATH, USE_SNAPSHOT, db_file_signature(DB_PATH))
+        except (OSError, sqlite3.Error):
+            return view(*args, **kwargs)
+        
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        entry = _response_cache.get(key, version)
+        if entry is None:
+            # Don't cache rows read through a connection to a replaced file
+            if not USE_SNAPSHOT:
+                get_db_connection(verify=True)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            entry = _response_cache.put(key, version, response.get_data())
+        
+        response = Response(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        # The data can change with the next rebuild, so clients must revalidate
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    return wrapper
+
+# Image versioning
+#
+# The extractor names images by content hash (<16 hex digits>.<ext>), so such
+# a URL always refers to the same bytes. Older per-question names
+# (question_<id>_img_<n>.png) are versioned by hashing the file and adding
+# ?v=<hash> to their URL.
+
+CONTENT_ADDRESSED_IMAGE = re.compile(r'^([0-9a-f]{16})\.\w+$')
+
+_image_versions = {}  # absolute path -> (mtime_ns, size, version)
+
+def image_file_path(filename):
+    """Absolute path of an image in IMAGES_DIR, or None if the name points outside it"""
+    path = safe_join(IMAGES_DIR, filename)
+    if path is None:
+        return None
+    # Relative to the app like send_from_directory
+    return os.path.join(app.root_path, path)
+
+def image_version(filename):
+    """
+    Content version of an image, or None if it doesn't exist.
+    
+    For content-addressed names this is the hash in the name; otherwise the
+    first 16 hex digits of the file's SHA-256, cached until the file changes.
+    """
+    match = CONTENT_ADDRESSED_IMAGE.match(filename)
+    if match:
+        return match.group(1)
+    
+    path = image_file_path(filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+        cached = _image_versions.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    
+    version = digest.hexdigest()[:16]
+    _image_versions[path] = (stat.st_mtime_ns, stat.st_size, version)
+    return version
+
+# Written by the extractor's --image-variants step
+IMAGE_VARIANTS_DIR = 'variants'
+
+_image_variants = {}  # manifest path -> (mtime_ns, images)
+
+def load_image_variants():
+    """Image filename -> variants entry from the variants manifest ({} if there is none)"""
+    path = image_file_path(f"{IMAGE_VARIANTS_DIR}/manifest.json")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    
+    cached = _image_variants.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            cached = (mtime, json.load(f)["images"])
+        _image_variants[path] = cached
+    return cached[1]
+
+def choose_image_variant(entry, width=None, accepts_webp=False):
+    """
+    Pick the smallest file the client can use for an image.
+    
+    The target is the narrowest available width of at least width (the full
+    size if width is None or wider than the image). Returns a variant from
+    the manifest entry, or None if the original is the best choice.
+    """
+    widths = sorted({variant["width"] for variant in entry["variants"]} | {entry["width"]})
+    target = entry["width"]
+    if width is not None:
+        target = next((w for w in widths if w >= width), entry["width"])
+    
+    best, best_bytes = None, entry["bytes"] if target == entry["width"] else None
+    for variant in entry["variants"]:
+        if variant["width"] != target or (variant["format"] == "webp" and not accepts_webp):
+            continue
+        if best_bytes is None or variant["bytes"] < best_bytes:
+            best, best_bytes = variant, variant["bytes"]
+    return best
+
+def image_urls(filenames):
+    """Cacheable URLs for images: content-addressed names as they are, others with ?v=<version>"""
+    urls = []
+    for filename in filenames:
+        url = IMAGE_URL_PREFIX + quote(filename)
+        if not CONTENT_ADDRESSED_IMAGE.match(filename):
+            version = image_version(filename)
+            if version is not None:
+                url += f"?v={version}"
+        urls.append(url)
+    return urls
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "ok", "message": "API is running"})
 
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters of the response cache"""
+    return jsonify({
+        "success": True,
+        "cache": _response_cache.stats()
+    })
+
 @app.route('/api/topics', methods=['GET'])
+@cached_response
 def get_topics():
     """Get all available topics from the database"""
     try:
+        if USE_SNAPSHOT:
+            return jsonify({
+                "success": True,
+                "topics": [{"id": topic_id, "name": name} for topic_id, name in get_question_bank().topics]
+            })
+        
         conn = get_db_connection()
         topics = conn.execute('SELECT id, name FROM topics ORDER BY name').fetchall()
-        conn.close()
         
         return jsonify({
             "success": True,
@@ -56,22 +817,31 @@ def get_topics():
         }), 500
 
 @app.route('/api/questions/count', methods=['GET'])
+@cached_response
 def get_question_count():
     """Get count of questions, optionally filtered by topic"""
     topic_id = request.args.get('topic_id')
     
     try:
-        conn = get_db_connection()
+        if USE_SNAPSHOT:
+            bank = get_question_bank()
+            if topic_id and topic_id != 'all':
+                topic_ids = parse_ids([topic_id])
+                count = bank.count(topic_ids[0]) if topic_ids else 0
+            else:
+                count = bank.count()
+            return jsonify({
+                "success": True,
+                "count": count
+            })
+        
+        stats = get_topic_stats()
         
         if topic_id and topic_id != 'all':
-            count = conn.execute(
-                'SELECT COUNT(*) FROM questions WHERE topic_id = ?', 
-                (topic_id,)
-            ).fetchone()[0]
+            topic_ids = parse_ids([topic_id])
+            count = stats.counts.get(topic_ids[0], 0) if topic_ids else 0
         else:
-            count = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
-        
-        conn.close()
+            count = stats.total
         
         return jsonify({
             "success": True,
@@ -84,10 +854,156 @@ def get_question_count():
             "error": "Failed to get question count"
         }), 500
 
+# Responses with more questions than this are streamed, this many at a time
+QUESTIONS_STREAM_CHUNK = 100
+
+def question_page(topic_id, cursor, limit):
+    """
+    One page of a topic's question IDs (all topics if topic_id is None).
+    
+    Keyset pagination: the page holds the first limit IDs greater than
+    cursor, found through the topic index (or the snapshot's sorted IDs)
+    rather than by skipping over earlier pages with OFFSET. Returns the IDs
+    and the cursor of the next page, None after the last page.
+    """
+    if USE_SNAPSHOT:
+        bank = get_question_bank()
+        ids = bank.question_ids if topic_id is None else bank.topic_index.ids.get(topic_id, ())
+        start = bisect_right(ids, cursor)
+        page = list(ids[start:start + limit + 1])
+    else:
+        conn = get_db_connection()
+        if topic_id is None:
+            rows = conn.execute(
+                'SELECT id FROM questions WHERE id > ? ORDER BY id LIMIT ?',
+                (cursor, limit + 1)
+            )
+        else:
+            rows = conn.execute(
+                'SELECT id FROM questions WHERE topic_id = ? AND id > ? ORDER BY id LIMIT ?',
+                (topic_id, cursor, limit + 1)
+            )
+        page = [row[0] for row in rows]
+    
+    # The extra row only tells whether there is another page
+    next_cursor = page[limit - 1] if len(page) > limit else None
+    return page[:limit], next_cursor
+
+def questions_response(question_ids, missing=None, **fields):
+    """
+    JSON response with the questions for question_ids, in that order.
+    
+    The questions are fetched and serialized QUESTIONS_STREAM_CHUNK at a time
+    with set-based queries; responses longer than one chunk are streamed, so
+    a large page is never held in memory whole. fields are added after the
+    questions. If missing is a list (of IDs already known not to exist), the
+    IDs that weren't found are added to it and it is returned as "missing".
+    Like jsonify, the JSON has no whitespace between items.
+    """
+    def load(ids):
+        if USE_SNAPSHOT:
+            bank = get_question_bank()
+            return [bank.question_dict(qid) for qid in ids if qid in bank.questions]
+        return fetch_questions(get_db_connection(), ids)
+    
+    def dumps(value):
+        return json.dumps(value, separators=(',', ':'))
+    
+    def generate():
+        found = set()
+        separator = ''
+        yield '{"success":true,"questions":['
+        for start in range(0, len(question_ids), QUESTIONS_STREAM_CHUNK):
+            for question in load(question_ids[start:start + QUESTIONS_STREAM_CHUNK]):
+                found.add(question["id"])
+                yield separator + dumps(question)
+                separator = ','
+        if missing is not None:
+            fields["missing"] = [qid for qid in question_ids if qid not in found] + missing
+        yield ']' + ''.join(f',{dumps(name)}:{dumps(value)}' for name, value in fields.items()) + '}'
+    
+    if len(question_ids) <= QUESTIONS_STREAM_CHUNK:
+        return Response(''.join(generate()), mimetype='application/json')
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@app.route('/api/questions', methods=['GET', 'POST'])
+def get_questions():
+    """
+    Get many questions in one response.
+    
+    With ids (comma-separated and/or repeated query parameters, or a JSON
+    list in a POST body) the questions are returned in the order asked for,
+    with the IDs that don't exist (then any that aren't integers, as given)
+    under "missing". Otherwise the questions of
+    topic_id (default all topics) are returned a page at a time in ID order:
+    pass next_cursor back as cursor for the following page. limit sets the
+    page size. At most MAX_BULK_QUESTIONS questions per request.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        raw_ids = data.get('ids') if isinstance(data.get('ids'), list) else None
+        if raw_ids is None:
+            return jsonify({
+                "success": False,
+                "error": "POST a JSON body with a list of ids"
+            }), 400
+    elif 'ids' in request.args:
+        raw_ids = [part for value in request.args.getlist('ids') for part in value.split(',') if part]
+    else:
+        raw_ids = None
+    
+    try:
+        if raw_ids is not None:
+            # Drop duplicates, keeping the requested order
+            question_ids = list(dict.fromkeys(parse_ids(raw_ids)))
+            invalid_ids = []
+            for value in raw_ids:
+                if parse_id(value) is None and value not in invalid_ids:
+                    invalid_ids.append(value)
+            if len(question_ids) + len(invalid_ids) > MAX_BULK_QUESTIONS:
+                return jsonify({
+                    "success": False,
+                    "error": f"At most {MAX_BULK_QUESTIONS} questions per request"
+                }), 400
+            return questions_response(question_ids, missing=invalid_ids)
+        
+        raw_topic_id = request.args.get('topic_id', 'all')
+        topic_id = None if raw_topic_id == 'all' else parse_id(raw_topic_id)
+        cursor = parse_id(request.args.get('cursor', '0'))
+        limit = parse_id(request.args.get('limit', str(QUESTIONS_PAGE_SIZE)))
+        if (topic_id is None and raw_topic_id != 'all') or cursor is None or limit is None:
+            return jsonify({
+                "success": False,
+                "error": "topic_id, cursor and limit must be integers"
+            }), 400
+        limit = min(max(limit, 1), MAX_BULK_QUESTIONS)
+        
+        question_ids, next_cursor = question_page(topic_id, cursor, limit)
+        return questions_response(question_ids, next_cursor=next_cursor)
+    except Exception as e:
+        logging.error(f"Error retrieving questions: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": "Failed to retrieve questions"
+        }), 500
+
 @app.route('/api/questions/<int:question_id>', methods=['GET'])
+@cached_response
 def get_question(question_id):
     """Get a specific question by ID with its options and images"""
     try:
+        if USE_SNAPSHOT:
+            question_dict = get_question_bank().question_dict(question_id, detail=True)
+            if question_dict is None:
+                return jsonify({
+                    "success": False,
+                    "error": "Question not found"
+                }), 404
+            return jsonify({
+                "success": True,
+                "question": question_dict
+            })
+        
         conn = get_db_connection()
         
         # Get question
@@ -102,7 +1018,6 @@ def get_question(question_id):
         ).fetchone()
         
         if not question:
-            conn.close()
             return jsonify({
                 "success": False,
                 "error": "Question not found"
@@ -129,12 +1044,11 @@ def get_question(question_id):
             (question_id,)
         ).fetchall()
         
-        conn.close()
-        
         # Convert to dictionary
         question_dict = dict(question)
         question_dict["options"] = [dict(opt) for opt in options]
         question_dict["images"] = [img["image_path"] for img in images]
+        question_dict["image_urls"] = image_urls(question_dict["images"])
         
         return jsonify({
             "success": True,
@@ -150,195 +1064,203 @@ def get_question(question_id):
 @app.route('/api/generate-quiz', methods=['POST'])
 def generate_quiz():
     """Generate a quiz based on selected topics and length"""
-    data = request.json
+    payload, status = build_quiz(request.json)
+    return jsonify(payload), status
+
+def build_quiz(data):
+    """
+    Build the generate-quiz response for a request body.
+    
+    Shared with the ASGI app (asgi.py). Returns (payload, status code).
+    """
     topics = data.get('topics', ['all'])
     quiz_length = min(int(data.get('length', 10)), 100)  # Limit to 100 questions max
     include_answers = data.get('include_answers', False)
+    seed = data.get('seed')  # Pass the seed of an earlier quiz to reproduce it
     
     try:
-        conn = get_db_connection()
-        
-        # Get questions based on topics
-        if 'all' in topics:
-            query = '''
-                SELECT q.id
-                FROM questions q
-                JOIN topics t ON q.topic_id = t.id
-            '''
-            questions = conn.execute(query).fetchall()
+        seed = int(seed) if seed is not None else random.randrange(1 << 32)
+    except (TypeError, ValueError):
+        return {
+            "success": False,
+            "error": "Invalid seed"
+        }, 400
+    
+    try:
+        if USE_SNAPSHOT:
+            bank = get_question_bank()
+            index = bank.topic_index
         else:
-            placeholders = ','.join('?' for _ in topics)
-            query = f'''
-                SELECT q.id
-                FROM questions q
-                JOIN topics t ON q.topic_id = t.id
-                WHERE t.id IN ({placeholders})
-            '''
-            questions = conn.execute(query, topics).fetchall()
+            index = get_topic_index()
         
-        # Convert to list of IDs
-        question_ids = [q['id'] for q in questions]
+        # Select random questions from the selected topics
+        topic_ids = None if 'all' in topics else parse_ids(topics)
+        selected_ids = index.sample(quiz_length, topic_ids, seed)
         
-        if not question_ids:
-            conn.close()
-            return jsonify({
+        if not selected_ids:
+            return {
                 "success": False,
                 "error": "No questions found for the selected topics"
-            }), 404
+            }, 404
         
-        # Select random questions
-        selected_ids = []
-        if len(question_ids) <= quiz_length:
-            selected_ids = question_ids
+        # Get full question data for selected IDs in one batch
+        if USE_SNAPSHOT:
+            quiz_questions = [bank.question_dict(qid) for qid in selected_ids]
         else:
-            selected_ids = random.sample(question_ids, quiz_length)
+            quiz_questions = fetch_questions(get_db_connection(), selected_ids)
         
-        # Get full question data for selected IDs
-        quiz_questions = []
-        for qid in selected_ids:
-            # Get question
-            question = conn.execute(
-                '''
-                SELECT q.id, q.question_html, q.answer, t.name as topic
-                FROM questions q
-                JOIN topics t ON q.topic_id = t.id
-                WHERE q.id = ?
-                ''',
-                (qid,)
-            ).fetchone()
-            
-            # Get options
-            options = conn.execute(
-                '''
-                SELECT option_letter, option_html
-                FROM options
-                WHERE question_id = ?
-                ORDER BY option_letter
-                ''',
-                (qid,)
-            ).fetchall()
-            
-            # Get images
-            images = conn.execute(
-                '''
-                SELECT image_path
-                FROM images
-                WHERE question_id = ?
-                ''',
-                (qid,)
-            ).fetchall()
-            
-            # Convert to dictionary
-            q_dict = dict(question)
-            q_dict["options"] = [dict(opt) for opt in options]
-            q_dict["images"] = [img["image_path"] for img in images]
-            
-            # Remove answer if not requested
-            if not include_answers:
+        # Remove answers if not requested
+        if not include_answers:
+            for q_dict in quiz_questions:
                 q_dict["answer"] = None
-                
-            quiz_questions.append(q_dict)
-        
-        conn.close()
         
         # Generate a unique quiz ID
         quiz_id = f"quiz_{random.randint(10000, 99999)}"
         
-        return jsonify({
+        return {
             "success": True,
             "quiz": {
                 "id": quiz_id,
                 "title": f"Nuclear Engineering Quiz - {len(quiz_questions)} Questions",
                 "questions": quiz_questions,
-                "total_questions": len(quiz_questions)
+                "total_questions": len(quiz_questions),
+                "seed": seed
             }
-        })
+        }, 200
     except Exception as e:
         logging.error(f"Error generating quiz: {str(e)}")
-        return jsonify({
+        return {
             "success": False,
             "error": "Failed to generate quiz"
-        }), 500
+        }, 500
 
 @app.route('/api/images/<path:filename>', methods=['GET'])
 def get_image(filename):
-    """Serve images from the images directory"""
-    return send_from_directory(IMAGES_DIR, filename)
+    """
+    Serve images from the images directory.
+    
+    The content version is sent as a strong ETag, and conditional (304) and
+    Range requests are honoured. Content-addressed names, and other names
+    requested with their current ?v= version, never change and are marked
+    immutable; anything else has to be revalidated.
+    """
+    version = image_version(filename)
+    if version is None:
+        abort(404)
+    
+    # Send a pre-generated variant if the extractor made any: WebP when the
+    # client asks for it, at the narrowest width that covers ?w=
+    entry = load_image_variants().get(filename)
+    variant = None
+    if entry is not None:
+        try:
+            width = int(request.args['w']) if 'w' in request.args else None
+        except ValueError:
+            width = None
+        accepts_webp = any(
+            mimetype == 'image/webp' and quality > 0 for mimetype, quality in request.accept_mimetypes
+        )
+        variant = choose_image_variant(entry, width, accepts_webp)
+    
+    immutable = bool(CONTENT_ADDRESSED_IMAGE.match(filename)) or request.args.get('v') == version
+    response = send_from_directory(
+        IMAGES_DIR,
+        f"{IMAGE_VARIANTS_DIR}/{variant['file']}" if variant else filename,
+        etag=f"{version}-{variant['width']}w-{variant['format']}" if variant else version,
+        max_age=IMAGE_CACHE_MAX_AGE if immutable else 0
+    )
+    if immutable:
+        response.cache_control.immutable = True
+    if entry is not None:
+        response.vary.add('Accept')
+    return response
 
 @app.route('/api/submit-answer', methods=['POST'])
 def submit_answer():
     """Submit an answer for a question and get feedback"""
-    data = request.json
+    payload, status = check_answer(request.json)
+    return jsonify(payload), status
+
+def check_answer(data):
+    """
+    Build the submit-answer response for a request body.
+    
+    Shared with the ASGI app (asgi.py). Returns (payload, status code).
+    """
     question_id = data.get('question_id')
     selected_option = data.get('selected_option')
     
     if not question_id or not selected_option:
-        return jsonify({
+        return {
             "success": False,
             "error": "Missing question ID or selected option"
-        }), 400
+        }, 400
     
     try:
-        conn = get_db_connection()
-        
-        # Get correct answer
-        question = conn.execute(
-            'SELECT answer FROM questions WHERE id = ?',
-            (question_id,)
-        ).fetchone()
+        if USE_SNAPSHOT:
+            question_ids = parse_ids([question_id])
+            question = get_question_bank().questions.get(question_ids[0]) if question_ids else None
+            correct_answer = question.answer if question else None
+        else:
+            conn = get_db_connection()
+            
+            # Get correct answer
+            question = conn.execute(
+                'SELECT answer FROM questions WHERE id = ?',
+                (question_id,)
+            ).fetchone()
+            correct_answer = question['answer'] if question else None
         
         if not question:
-            conn.close()
-            return jsonify({
+            return {
                 "success": False,
                 "error": "Question not found"
-            }), 404
+            }, 404
         
-        correct_answer = question['answer']
         is_correct = selected_option == correct_answer
         
-        conn.close()
-        
-        return jsonify({
+        return {
             "success": True,
             "result": {
                 "is_correct": is_correct,
                 "correct_answer": correct_answer,
                 "selected_option": selected_option
             }
-        })
+        }, 200
     except Exception as e:
         logging.error(f"Error submitting answer: {str(e)}")
-        return jsonify({
+        return {
             "success": False,
             "error": "Failed to submit answer"
-        }), 500
+        }, 500
 
 @app.route('/api/stats', methods=['GET'])
+@cached_response
 def get_stats():
     """Get statistics about the question database"""
     try:
-        conn = get_db_connection()
-        
-        # Get total questions
-        total_questions = conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
-        
-        # Get questions per topic
-        topic_stats = conn.execute('''
-            SELECT t.name, COUNT(q.id) as question_count
-            FROM topics t
-            LEFT JOIN questions q ON t.id = q.topic_id
-            GROUP BY t.id
-            ORDER BY question_count DESC
-        ''').fetchall()
+        if USE_SNAPSHOT:
+            bank = get_question_bank()
+            return jsonify({
+                "success": True,
+                "stats": {
+                    "total_questions": bank.count(),
+                    "questions_with_images": bank.with_images,
+                    "questions_missing_answer": bank.missing_answers,
+                    "topics": bank.topic_stats()
+                }
+            })
         
-        conn.close()
+        # Precomputed per-topic counts, reloaded only when the database changes
+        stats = get_topic_stats()
         
         return jsonify({
             "success": True,
             "stats": {
-                "total_questions": total_questions,
-                "topics": [dict(stat) for stat in topic_stats]
+                "total_questions": stats.total,
+                "questions_with_images": stats.with_images,
+                "questions_missing_answer": stats.missing_answers,
+                "topics": [dict(topic) for topic in stats.topics]
             }
         })
     except Exception as e:
@@ -348,16 +1270,44 @@ def get_stats():
             "error": "Failed to retrieve stats"
         }), 500
 
+def create_app():
+    """
+    Return the app ready to serve, for WSGI servers (see wsgi.py).
+    The routes are registered on the module-level app, so this prepares and
+    returns that app rather than building a new one.
+    
+    Checks that the database exists and loads the topic index and counts,
+    the question bank snapshot (if enabled) and the image variants manifest. With
+    gunicorn's preload_app this runs once in the master process and the
+    workers inherit the loaded data on fork instead of each loading it on
+    their first request. No database connection is left open, since SQLite
+    connections must not be carried across fork(); each worker thread opens
+    its own on first use.
+    """
+    if not os.path.exists(DB_PATH):
+        raise RuntimeError(f"Database not found at {DB_PATH}, run the PDF extraction script first")
+    
+    get_topic_index()
+    get_topic_stats()
+    if USE_SNAPSHOT:
+        get_question_bank()
+    load_image_variants()
+    close_db_pool()
+    
+    logging.info(f"Quiz API ready (database {DB_PATH}, snapshot {'on' if USE_SNAPSHOT else 'off'})")
+    return app
+
 if __name__ == '__main__':
-    # Get port from environment or default to 5000
+    # Development server only; use wsgi.py (gunicorn or waitress) in production
     port = int(os.environ.get('PORT', 5000))
+    host = os.environ.get('HOST', '127.0.0.1')
+    debug = os.environ.get('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
     
-    # Check if database exists
-    if not os.path.exists(DB_PATH):
-        logging.error(f"Database not found at {DB_PATH}")
-        print(f"ERROR: Database not found at {DB_PATH}")
-        print("Please run the PDF extraction script first to create the database.")
+    try:
+        create_app()
+    except RuntimeError as e:
+        logging.error(str(e))
+        print(f"ERROR: {e}")
         exit(1)
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,83 @@
+"""
+Production entry point for the quiz API.
+
+Run from the backend directory with gunicorn (Linux/macOS):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+or with waitress (any platform, one process with a thread pool):
+
+    python wsgi.py
+
+Both read their settings from the environment (and .env): HOST, PORT,
+WEB_CONCURRENCY (gunicorn worker processes), WEB_THREADS (threads per
+worker) and GRACEFUL_TIMEOUT (seconds in-flight requests get to finish on
+shutdown).
+"""
+import _thread
+import os
+import signal
+import threading
+import time
+
+from quiz_app_backend import create_app
+
+app = create_app()
+
+def serve_waitress():
+    """
+    Serve app with waitress until SIGTERM (or SIGINT).
+    
+    On SIGTERM the listening sockets are closed, the requests already being
+    handled get GRACEFUL_TIMEOUT seconds to finish and have their responses
+    sent, and then the server stops. waitress's own shutdown (on SIGINT)
+    cancels whatever is still running after 5 seconds.
+    """
+    from waitress import create_server
+    from waitress.server import BaseWSGIServer
+    
+    graceful_timeout = float(os.environ.get('GRACEFUL_TIMEOUT', 30))
+    socket_map = {}
+    server = create_server(
+        app,
+        map=socket_map,
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 5000)),
+        threads=int(os.environ.get('WEB_THREADS', 8))
+    )
+    
+    def close_listener(listener):
+        listener.del_channel()
+        listener.socket.close()
+    
+    def drain():
+        deadline = time.monotonic() + graceful_timeout
+        try:
+            # Stop accepting connections. Sockets are closed from the event
+            # loop (through its trigger), never while it is polling them.
+            for listener in [d for d in list(socket_map.values()) if isinstance(d, BaseWSGIServer)]:
+                listener.trigger.pull_trigger(lambda listener=listener: close_listener(listener))
+            # Let the threads finish the requests already accepted, queued ones
+            # included (stopped threads don't take new tasks), then stop them
+            dispatcher = server.task_dispatcher
+            while time.monotonic() < deadline and (dispatcher.queue or dispatcher.active_count):
+                time.sleep(0.05)
+            dispatcher.shutdown(cancel_pending=False, timeout=max(0, deadline - time.monotonic()))
+            # The event loop sends the responses, so it keeps running until they are out
+            while time.monotonic() < deadline and any(
+                getattr(channel, 'total_outbufs_len', 0) for channel in list(socket_map.values())
+            ):
+                time.sleep(0.05)
+        finally:
+            # Ends server.run() in the main thread
+            _thread.interrupt_main()
+    
+    def stop(signum, frame):
+        threading.Thread(target=drain, daemon=True).start()
+    
+    signal.signal(signal.SIGTERM, stop)
+    server.print_listen("Serving on http://{}:{}")
+    server.run()
+
+if __name__ == '__main__':
+    serve_waitress()
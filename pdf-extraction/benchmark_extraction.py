@@ -0,0 +1,277 @@
+"""
+Benchmarks for the PDF extraction pipeline.
+
+Run from the pdf-extraction directory, e.g.
+
+    python benchmark_extraction.py workers path/to/questions.pdf --workers 1 2 4 8
+"""
+import argparse
+import filecmp
+import importlib.util
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf-extraction-code.py")
+
+def load_extraction_module():
+    """Import pdf-extraction-code.py (its file name isn't a valid module name)"""
+    spec = importlib.util.spec_from_file_location("pdf_extraction_code", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def legacy_page_text(page):
+    """
+    The original per-page text work, kept as a baseline: get_text("html")
+    parsed with BeautifulSoup plus three plain get_text() calls, with the
+    stem and options located by scanning the soup.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page.get_text("html"), 'html.parser')
+    topic_match = re.search(r"TOPIC:\s*(.*?)(?:\n|$)", page.get_text())
+    answer_match = re.search(r"ANSWER:\s*([A-D])\.?", page.get_text())
+
+    content = ""
+    in_question = False
+    for element in soup.find_all(['p', 'div']):
+        text = element.get_text().strip()
+        if not in_question and "TOPIC:" in text:
+            in_question = True
+            continue
+        if in_question and re.match(r"^[Aa]\.\s*.*", text):
+            break
+        if in_question:
+            content += str(element)
+
+    options = []
+    page_text = page.get_text()
+    for letter, text in re.findall(r"([A-D])\.\s+(.*?)(?=\s+[A-D]\.\s+|\s+ANSWER:|$)", page_text, re.DOTALL):
+        for element in soup.find_all(['p', 'div']):
+            element_text = element.get_text().strip()
+            if letter + "." in element_text and text.strip() in element_text:
+                options.append(str(element))
+                break
+    return topic_match, answer_match, content, options
+
+def single_pass_page_text(extraction, page):
+    """The per-page text work of the current extractor"""
+    context = extraction.build_page_context(page)
+    topic_match = re.search(r"TOPIC:\s*(.*?)(?:\n|$)", context["text"])
+    answer_match = re.search(r"ANSWER:\s*([A-D])\.?", context["text"])
+    layout = extraction.scan_page_lines(context["lines"])
+    content = extraction.extract_question_content(context["lines"], layout)
+    options = extraction.extract_options(context["lines"], context["text"], layout)
+    return topic_match, answer_match, content, options
+
+def per_option_scan_options(lines, page_text):
+    """
+    Option matching as it was before the single-scan rewrite, kept as a
+    baseline: every regex match, and every letter in the fallback, rescans
+    all lines of the page.
+    """
+    options = []
+    for letter, text in re.findall(r"([A-D])\.\s+(.*?)(?=\s+[A-D]\.\s+|\s+ANSWER:|$)", page_text, re.DOTALL):
+        option_html = ""
+        for line in lines:
+            line_text = line["text"].strip()
+            if letter + "." in line_text and text.strip() in line_text:
+                option_html = re.sub(r"<[^>]*>\s*" + letter + r"\.\s*</[^>]*>", "", line["html"])
+                break
+        if not option_html:
+            option_html = f"<p>{text.strip()}</p>"
+        options.append(option_html)
+
+    if len(options) != 4:
+        options = []
+        for letter in ['A', 'B', 'C', 'D']:
+            for line in lines:
+                line_text = line["text"].strip()
+                if line_text.startswith(f"{letter}."):
+                    options.append(f"<p>{line_text[len(f'{letter}.'):].strip()}</p>")
+                    break
+            else:
+                options.append(f"<p>Option {letter} (not found)</p>")
+    return options
+
+def bench_workers(args):
+    """Measure pages/sec of a full extraction for each worker count"""
+    import fitz
+    with fitz.open(args.pdf_path) as doc:
+        total_pages = len(doc)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reference = None
+        print(f"{'workers':>7} {'seconds':>8} {'pages/s':>8} {'identical':>9}")
+        for workers in args.workers:
+            output_dir = os.path.join(tmp_dir, f"workers_{workers}")
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, SCRIPT_PATH, os.path.abspath(args.pdf_path), "--output-dir", output_dir, "--workers", str(workers)],
+                check=True, cwd=tmp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            elapsed = time.perf_counter() - start
+
+            output_file = os.path.join(output_dir, "nuclear_questions.json")
+            if reference is None:
+                reference = output_file
+            identical = filecmp.cmp(reference, output_file, shallow=False)
+            print(f"{workers:>7} {elapsed:>8.2f} {total_pages / elapsed:>8.1f} {str(identical):>9}")
+
+def bench_page_text(args):
+    """Per-page time of the text extraction step, before and after the single-pass rewrite"""
+    import fitz
+    extraction = load_extraction_module()
+
+    with fitz.open(args.pdf_path) as doc:
+        pages = [doc[page_num] for page_num in range(min(args.pages, len(doc)))]
+        print(f"{'path':>12} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, run in (
+            ("legacy", legacy_page_text),
+            ("single-pass", lambda page: single_pass_page_text(extraction, page))
+        ):
+            timings = []
+            for page in pages:
+                start = time.perf_counter()
+                run(page)
+                timings.append((time.perf_counter() - start) * 1000)
+            ordered = sorted(timings)
+            print(f"{name:>12} {statistics.mean(timings):>8.2f} {statistics.median(timings):>8.2f} "
+                  f"{ordered[int(0.99 * (len(ordered) - 1))]:>8.2f}")
+
+def bench_options(args):
+    """Time option matching per page, per-option rescans vs the single scan, and compare results"""
+    import fitz
+    extraction = load_extraction_module()
+
+    with fitz.open(args.pdf_path) as doc:
+        contexts = [extraction.build_page_context(page) for page in doc]
+
+    def single_scan(lines, page_text):
+        return extraction.extract_options(lines, page_text, extraction.scan_page_lines(lines))
+
+    results = {}
+    print(f"{'path':>12} {'total ms':>9} {'us/page':>8}")
+    for name, extract in (("per-option", per_option_scan_options), ("single-scan", single_scan)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results[name] = [extract(context["lines"], context["text"]) for context in contexts]
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:>12} {elapsed:>9.1f} {elapsed * 1000 / (args.repeat * len(contexts)):>8.1f}")
+
+    mismatches = sum(a != b for a, b in zip(results["per-option"], results["single-scan"]))
+    print(f"pages: {len(contexts)}, pages with different options: {mismatches}")
+
+def legacy_has_diagram_content(img):
+    """The original per-pixel Python count, kept as a baseline"""
+    gray_img = img.convert('L')
+    non_white_pixels = sum(1 for pixel in gray_img.getdata() if pixel < 240)
+    return non_white_pixels > (gray_img.width * gray_img.height * 0.05)
+
+def bench_diagrams(args):
+    """Time diagram detection on the extracted images and rendered PDF pages"""
+    from PIL import Image
+    extraction = load_extraction_module()
+
+    images = []
+    for filename in sorted(os.listdir(args.images_dir))[:args.limit]:
+        with Image.open(os.path.join(args.images_dir, filename)) as img:
+            images.append(img.convert("RGB"))
+    if args.pdf:
+        import fitz
+        with fitz.open(args.pdf) as doc:
+            for page in list(doc)[:args.limit]:
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                images.append(Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples))
+
+    results = {}
+    print(f"{'detector':>10} {'total s':>8} {'ms/image':>9}")
+    for name, detect in (
+        ("legacy", legacy_has_diagram_content),
+        ("histogram", lambda img: extraction.find_diagram_content(img) is not None)
+    ):
+        start = time.perf_counter()
+        results[name] = [detect(img) for img in images]
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {elapsed:>8.2f} {elapsed * 1000 / len(images):>9.2f}")
+
+    disagreements = sum(a != b for a, b in zip(results["legacy"], results["histogram"]))
+    print(f"images: {len(images)}, with diagrams: {sum(results['legacy'])}, disagreements: {disagreements}")
+
+def legacy_clean_html(html_content):
+    """The original clean_html (five substitutions, patterns compiled per call), kept as a baseline"""
+    if not html_content:
+        return ""
+    html_content = re.sub(r'\s+', ' ', html_content)
+    html_content = re.sub(r'<sub>(.*?)</sub>', r'<sub>\1</sub>', html_content)
+    html_content = re.sub(r'<sup>(.*?)</sup>', r'<sup>\1</sup>', html_content)
+    html_content = re.sub(r'(\d+)/(\d+)', r'<span class="fraction">\1/\2</span>', html_content)
+    html_content = html_content.replace('&nbsp;', ' ')
+    return html_content
+
+def bench_clean_html(args):
+    """Throughput of clean_html over every stem and option of an extraction"""
+    import json
+    extraction = load_extraction_module()
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)
+    # Undo the earlier fraction markup so both versions see raw extractor output
+    fragments = [
+        re.sub(r'<span class="fraction">([^<]*)</span>', r"\1", fragment)
+        for q in questions for fragment in [q["question_html"]] + q["options"]
+    ]
+    total_bytes = sum(len(fragment) for fragment in fragments)
+
+    print(f"{'version':>8} {'MB/s':>8} {'us/fragment':>12} {'fractions':>10}")
+    for name, clean in (("legacy", legacy_clean_html), ("current", extraction.clean_html)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            cleaned = [clean(fragment) for fragment in fragments]
+        elapsed = (time.perf_counter() - start) / args.repeat
+        fractions = sum(fragment.count('class="fraction"') for fragment in cleaned)
+        print(f"{name:>8} {total_bytes / elapsed / 1e6:>8.1f} {elapsed * 1e6 / len(fragments):>12.2f} {fractions:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF extraction pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    workers = subparsers.add_parser("workers", help="Pages/sec against worker count")
+    workers.add_argument("pdf_path", help="Path to the PDF file")
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    workers.set_defaults(func=bench_workers)
+
+    page_text = subparsers.add_parser("page-text", help="Per-page text extraction time, legacy vs single pass")
+    page_text.add_argument("pdf_path", help="Path to the PDF file")
+    page_text.add_argument("--pages", type=int, default=200, help="Number of pages to time")
+    page_text.set_defaults(func=bench_page_text)
+
+    options = subparsers.add_parser("options", help="Option matching, per-option rescans vs single scan")
+    options.add_argument("pdf_path", help="Path to the PDF file")
+    options.add_argument("--repeat", type=int, default=20, help="Times to run over all pages")
+    options.set_defaults(func=bench_options)
+
+    diagrams = subparsers.add_parser("diagrams", help="Diagram detection, per-pixel count vs histogram")
+    diagrams.add_argument("--images-dir", default=os.path.join("extracted_data", "images"),
+                          help="Directory of extracted images to run the detectors on")
+    diagrams.add_argument("--pdf", help="Also run on 2x renders of this PDF's pages")
+    diagrams.add_argument("--limit", type=int, default=200, help="Maximum images (and pages) to use")
+    diagrams.set_defaults(func=bench_diagrams)
+
+    clean = subparsers.add_parser("clean-html", help="clean_html throughput, legacy vs single pass")
+    clean.add_argument("--questions", default=os.path.join("extracted_data", "nuclear_questions.json"),
+                       help="Extracted questions to run clean_html over")
+    clean.add_argument("--repeat", type=int, default=5, help="Times to run over all fragments")
+    clean.set_defaults(func=bench_clean_html)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
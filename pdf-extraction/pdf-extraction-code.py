@@ -3,11 +3,15 @@ import re
 import json
 import os
 import base64
-from bs4 import BeautifulSoup
 import html
+from html.parser import HTMLParser
 from PIL import Image
 import io
 import logging
+import hashlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
 
 # Set up logging
 logging.basicConfig(
@@ -19,7 +23,11 @@ logging.basicConfig(
     ]
 )
 
-def extract_questions_from_pdf(pdf_path, output_dir):
+# Bump when a change to the extraction code changes its output, so the next
+# incremental run re-extracts every page instead of trusting the manifest
+EXTRACTOR_VERSION = 8
+
+def extract_questions_from_pdf(pdf_path, output_dir, workers=1, json_format="indent", resume=False):
     """
     Extract questions from PDF while preserving formatting.
     
@@ -30,105 +38,784 @@ def extract_questions_from_pdf(pdf_path, output_dir):
     Args:
         pdf_path: Path to the PDF file
         output_dir: Directory to save the extracted data
+        workers: Number of processes to extract pages with. Pages are
+            independent, so they are split into ranges that each worker
+            extracts from its own copy of the PDF; the results are merged in
+            page order, so the output is the same as a serial run.
+        json_format: Format of the nuclear_questions.json built at the end
+            (see write_questions)
+        resume: Continue an interrupted run of the same PDF from its last
+            checkpoint instead of starting over. Progress is checkpointed
+            every CHECKPOINT_INTERVAL pages and when the run is interrupted.
     
     Returns:
-        List of extracted question objects
+        QuestionStream over the extracted questions; questions are written
+        out as their pages finish and never all held in memory
     """
     # Create output directories
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
     
-    # Open the PDF
-    doc = fitz.open(pdf_path)
-    total_pages = len(doc)
+    # Hash every page so a later incremental run can tell what changed
+    page_hashes = compute_page_hashes(pdf_path)
+    total_pages = len(page_hashes)
     logging.info(f"Processing PDF with {total_pages} pages")
     
-    questions = []
+    # One question per page, so the questions already written are the pages done
+    checkpoint = new_checkpoint(pdf_path, page_hashes)
+    start_page = resume_checkpoint(checkpoint, output_dir) if resume else 0
+    if start_page:
+        logging.info(f"Resuming after page {start_page} of {total_pages}")
     
-    # Process each page (question)
-    for page_num in range(total_pages):
-        if page_num % 50 == 0:
-            logging.info(f"Processing page {page_num+1}/{total_pages}")
-        
-        page = doc[page_num]
-        
-        # Get raw HTML representation (preserves formatting)
-        html_text = page.get_text("html")
-        soup = BeautifulSoup(html_text, 'html.parser')
-        
-        # Extract topic
-        topic_match = re.search(r"TOPIC:\s*(.*?)(?:\n|$)", page.get_text())
-        topic = topic_match.group(1).strip() if topic_match else "Unknown"
-        
-        # Extract answer
-        answer_match = re.search(r"ANSWER:\s*([A-D])\.?", page.get_text())
-        answer = answer_match.group(1) if answer_match else None
-        
-        # Extract full question text with formatting
-        question_html = extract_question_content(soup)
-        
-        # Extract options A, B, C, D
-        options = extract_options(soup, page.get_text())
-        
-        # Extract images if present
-        images = extract_images(doc, page, page_num, output_dir)
-        
-        # Create question object
-        question = {
-            "id": page_num + 1,
-            "topic": topic,
-            "question_html": clean_html(question_html),
-            "options": [clean_html(opt) for opt in options],
-            "answer": answer,
-            "images": images,
-            "page_number": page_num + 1
-        }
-        
-        questions.append(question)
+    questions = write_questions(
+        normalize_questions(extract_pages(pdf_path, list(range(start_page, total_pages)), output_dir, workers)),
+        output_dir, json_format, checkpoint
+    )
+    save_manifest(pdf_path, page_hashes, output_dir)
+    
+    return questions
+
+def update_questions_from_pdf(pdf_path, output_dir, workers=1, json_format="indent"):
+    """
+    Re-extract only the pages whose content changed since the last run.
+    
+    Each page's content hash is compared with the extraction manifest written
+    by the previous run; only new or changed pages are extracted again and
+    merged into the previous questions as they are streamed to the new
+    output. Falls back to a full extraction when there is no usable manifest
+    or previous output.
+    
+    Returns:
+        Tuple of (QuestionStream over all questions, changed or added
+        questions, removed question IDs)
+    """
+    manifest = load_manifest(output_dir)
+    
+    if (manifest is None or manifest.get("extractor_version") != EXTRACTOR_VERSION
+            or not has_questions(output_dir)):
+        logging.info("No usable extraction manifest, extracting all pages")
+        questions = extract_questions_from_pdf(pdf_path, output_dir, workers, json_format)
+        return questions, questions, []
+    
+    previous = load_questions(output_dir)
+    previous_ids = {q["id"] for q in previous}
+    
+    page_hashes = compute_page_hashes(pdf_path)
+    old_hashes = manifest["pages"]
+    changed_pages = [
+        page_num for page_num, page_hash in enumerate(page_hashes)
+        if old_hashes.get(str(page_num + 1)) != page_hash or (page_num + 1) not in previous_ids
+    ]
+    removed_ids = sorted(qid for qid in previous_ids if qid > len(page_hashes))
+    logging.info(
+        f"{len(changed_pages)} of {len(page_hashes)} pages changed, "
+        f"{len(removed_ids)} removed"
+    )
+    
+    changed_questions = list(normalize_questions(extract_pages(pdf_path, changed_pages, output_dir, workers)))
+    
+    # Images used by the old versions of changed and removed pages
+    old_images = set()
+    
+    def merged_questions():
+        """The previous questions with changed ones replaced, in ID order"""
+        replaced = set(removed_ids) | {q["id"] for q in changed_questions}
+        pending = iter(changed_questions)  # in page (= ID) order
+        next_changed = next(pending, None)
+        for question in previous:
+            while next_changed is not None and next_changed["id"] <= question["id"]:
+                yield next_changed
+                next_changed = next(pending, None)
+            if question["id"] in replaced:
+                old_images.update(question["images"])
+            else:
+                yield question
+        if next_changed is not None:
+            yield next_changed
+            yield from pending
+    
+    questions = write_questions(merged_questions(), output_dir, json_format)
+    
+    # Images are shared between questions, so only drop the unused ones
+    remove_unused_images(old_images, questions, output_dir)
+    
+    save_manifest(pdf_path, page_hashes, output_dir)
+    
+    return questions, changed_questions, removed_ids
+
+# Batch ingestion
+#
+# A question bank can hold the questions of several PDFs ("sources"). Each
+# source is extracted into its own directory under sources/ with the usual
+# outputs (manifest, checkpoint, NDJSON), so single-PDF incremental runs and
+# --resume work per source, and the sources are then merged into the bank's
+# own outputs. sources.json gives every source a stable ID in the order the
+# bank first saw them; question IDs are derived from it (see question_id).
+
+SOURCES_DIR = "sources"
+SOURCES_FILE = "sources.json"
+# Question IDs are source_id * SOURCE_ID_STRIDE + page_number, so source 0
+# keeps the page-number IDs of a single-PDF extraction
+SOURCE_ID_STRIDE = 100000
+# Name of source 0 when the single-PDF extraction it comes from predates
+# extraction manifests, which record the PDF's name
+UNNAMED_SOURCE = "(extracted without a manifest)"
+
+def question_id(source_id, page_number):
+    """Stable ID of the question on page_number of a source"""
+    return source_id * SOURCE_ID_STRIDE + page_number
+
+def find_pdfs(paths):
+    """Expand directories in paths to the PDFs in them, in name order"""
+    pdf_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_paths.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".pdf")
+            ))
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+def load_sources(output_dir):
+    """
+    The sources of the bank in output_dir, in ID order.
+    
+    A single-PDF extraction has no sources.json; its PDF is source 0, named
+    from the extraction manifest, or UNNAMED_SOURCE for an extraction older
+    than manifests (such as the shipped extracted_data).
+    """
+    sources_file = os.path.join(output_dir, SOURCES_FILE)
+    if os.path.exists(sources_file):
+        with open(sources_file, encoding="utf-8") as f:
+            return json.load(f)
+    manifest = load_manifest(output_dir)
+    if manifest is not None:
+        return [{"id": 0, "name": manifest["pdf"], "pages": len(manifest["pages"])}]
+    if has_questions(output_dir):
+        pages = max((question["page_number"] for question in load_questions(output_dir)), default=0)
+        return [{"id": 0, "name": UNNAMED_SOURCE, "pages": pages}]
+    return []
+
+def register_sources(pdf_paths, output_dir):
+    """
+    Add the PDFs to the bank's sources, keeping the IDs of known ones.
+    
+    Sources are identified by file name, so a re-exported PDF with the same
+    name keeps its ID (and its question IDs).
+    
+    Returns:
+        List of sources, in ID order
+    """
+    sources = load_sources(output_dir)
+    known = {source["name"] for source in sources}
+    for pdf_path in pdf_paths:
+        name = os.path.basename(pdf_path)
+        if name not in known:
+            sources.append({"id": max((source["id"] for source in sources), default=-1) + 1,
+                            "name": name, "pages": 0})
+            known.add(name)
+    return sources
+
+def source_dir(output_dir, source):
+    """Directory a source is extracted into (named by ID, which is unique where names may only differ in case)"""
+    return os.path.join(output_dir, SOURCES_DIR, str(source["id"]))
+
+def adopt_single_extraction(output_dir, sources):
+    """
+    Move a single-PDF extraction in output_dir into its source directory.
+    
+    Before its first batch run a bank is a plain extraction whose PDF
+    load_sources reports as source 0, but whose outputs sit in output_dir
+    itself. They are copied into the source directory (images hard-linked)
+    so merging keeps its questions; without this a batch run would replace
+    them with those of the new PDFs only.
+    """
+    if os.path.exists(os.path.join(output_dir, SOURCES_FILE)) or not sources or not has_questions(output_dir):
+        return
+    pdf_dir = source_dir(output_dir, sources[0])
+    if has_questions(pdf_dir):
+        return
+    
+    logging.info(f"Moving the extraction of {sources[0]['name']} to {pdf_dir}")
+    os.makedirs(os.path.join(pdf_dir, "images"), exist_ok=True)
+    for question in load_questions(output_dir):
+        for image_filename in question["images"]:
+            image_path = os.path.join(pdf_dir, "images", image_filename)
+            if not os.path.exists(image_path):
+                copy_image(os.path.join(output_dir, "images", image_filename), image_path)
+    for filename in ("extraction_manifest.json", "topics.json", QUESTIONS_JSON, QUESTIONS_NDJSON):
+        if os.path.exists(os.path.join(output_dir, filename)):
+            shutil.copyfile(os.path.join(output_dir, filename), os.path.join(pdf_dir, filename))
+
+def ingest_source(pdf_path, output_dir, incremental=False, resume=False):
+    """
+    Extract one PDF of a batch into its source directory (run in worker processes).
+    
+    Returns:
+        Number of pages in the PDF
+    """
+    if incremental:
+        questions = update_questions_from_pdf(pdf_path, output_dir, json_format="none")[0]
+    else:
+        questions = extract_questions_from_pdf(pdf_path, output_dir, json_format="none", resume=resume)
+    return len(questions)
+
+def ingest_pdfs(pdf_paths, output_dir, workers=1, incremental=False, resume=False, json_format="indent"):
+    """
+    Extract several PDFs concurrently and merge them into one question bank.
+    
+    Each PDF is extracted serially in one of workers processes (PDFs rather
+    than pages are the unit of work here). The given PDFs are added to the
+    bank's sources; sources ingested by earlier runs stay in the bank, so a
+    new exam can be added without re-extracting the others. The merged
+    questions get stable IDs from their source ID and page number and a
+    source_id field, and their images are gathered into the bank's images
+    directory (images are content-addressed, so a figure shared between
+    PDFs is stored once).
+    
+    Args:
+        pdf_paths: PDFs to ingest; file names must be unique (ValueError
+            otherwise), as they identify the sources
+        output_dir: Directory of the bank
+        workers: Number of PDFs to extract at once
+        incremental, resume: Passed on to the extraction of each PDF (see
+            update_questions_from_pdf and extract_questions_from_pdf)
+        json_format: Format of the bank's nuclear_questions.json
+    
+    Returns:
+        Tuple of (QuestionStream over the bank's questions, list of sources)
+    """
+    names = [os.path.basename(pdf_path) for pdf_path in pdf_paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"PDFs of a batch must have different file names: {', '.join(duplicates)}")
+    
+    os.makedirs(os.path.join(output_dir, "images"), exist_ok=True)
+    adopt_single_extraction(output_dir, load_sources(output_dir))
+    sources = register_sources(pdf_paths, output_dir)
+    by_name = {source["name"]: source for source in sources}
+    jobs = [(pdf_path, source_dir(output_dir, by_name[os.path.basename(pdf_path)])) for pdf_path in pdf_paths]
+    logging.info(f"Ingesting {len(jobs)} PDFs with {min(workers, len(jobs))} workers")
+    
+    if workers <= 1 or len(jobs) <= 1:
+        page_counts = [ingest_source(pdf_path, pdf_dir, incremental, resume) for pdf_path, pdf_dir in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            page_counts = list(executor.map(
+                ingest_source, *zip(*jobs), repeat(incremental), repeat(resume)
+            ))
+    for pdf_path, pages in zip(pdf_paths, page_counts):
+        by_name[os.path.basename(pdf_path)]["pages"] = pages
+    
+    # Images the sources provided to the bank so far; other files in its
+    # images directory aren't the batch's to remove
+    previous_images = (
+        {image_filename for question in load_questions(output_dir) for image_filename in question["images"]}
+        if has_questions(output_dir) else set()
+    )
+    questions = write_questions(merge_sources(sources, output_dir), output_dir, json_format)
+    
+    # Drop images no source uses any more
+    remove_unused_images(previous_images, questions, output_dir)
+    
+    with open(os.path.join(output_dir, SOURCES_FILE), "w", encoding="utf-8") as f:
+        json.dump(sources, f, ensure_ascii=False, indent=2)
+    logging.info(f"Question bank has {len(questions)} questions from {len(sources)} sources")
+    return questions, sources
+
+def merge_sources(sources, output_dir):
+    """Yield the questions of every source in ID order, with stable IDs, linking their images into the bank"""
+    images_dir = os.path.join(output_dir, "images")
+    for source in sources:
+        pdf_dir = source_dir(output_dir, source)
+        if not has_questions(pdf_dir):
+            logging.warning(f"No extracted questions for source {source['name']}, skipping it")
+            continue
+        for question in load_questions(pdf_dir):
+            for image_filename in question["images"]:
+                image_path = os.path.join(images_dir, image_filename)
+                if not os.path.exists(image_path):
+                    copy_image(os.path.join(pdf_dir, "images", image_filename), image_path)
+            yield {
+                **question,
+                "id": question_id(source["id"], question["page_number"]),
+                "source_id": source["id"]
+            }
+
+def copy_image(src, dst):
+    """Hard-link an image file into place, copying it where links aren't supported"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+# Questions are written as NDJSON (one JSON object per line) while they are
+# extracted; nuclear_questions.json is built from it at the end
+QUESTIONS_NDJSON = "nuclear_questions.ndjson"
+QUESTIONS_JSON = "nuclear_questions.json"
+JSON_FORMATS = ("indent", "compact", "none")
+
+class QuestionStream:
+    """
+    Re-iterable view of an NDJSON question file.
+    
+    Every iteration reads the file again one line at a time, so the
+    questions are never all in memory.
+    """
+    
+    def __init__(self, path):
+        self.path = path
     
-    # Save questions to JSON file
-    output_file = os.path.join(output_dir, "nuclear_questions.json")
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(questions, f, ensure_ascii=False, indent=2)
+    def __iter__(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
     
-    logging.info(f"Extracted {len(questions)} questions to {output_file}")
+    def __len__(self):
+        with open(self.path, encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+
+def has_questions(output_dir):
+    """Whether output_dir holds the questions of an earlier extraction"""
+    return any(
+        os.path.exists(os.path.join(output_dir, filename))
+        for filename in (QUESTIONS_NDJSON, QUESTIONS_JSON)
+    )
+
+def load_questions(output_dir):
+    """
+    The questions of an earlier extraction, in ID order.
+    
+    Streams nuclear_questions.ndjson; outputs from before the NDJSON file
+    existed only have nuclear_questions.json, which is read as a list.
+    """
+    ndjson_path = os.path.join(output_dir, QUESTIONS_NDJSON)
+    if os.path.exists(ndjson_path):
+        return QuestionStream(ndjson_path)
+    with open(os.path.join(output_dir, QUESTIONS_JSON), encoding="utf-8") as f:
+        return json.load(f)
+
+def write_questions(questions, output_dir, json_format="indent", checkpoint=None):
+    """
+    Stream questions to nuclear_questions.ndjson and write topics.json.
+    
+    Each question is written and flushed as soon as it arrives. The lines go
+    to a .partial file that replaces the NDJSON file once every question is
+    in, so a crash keeps the finished pages without leaving a truncated file
+    under the real name. Unless json_format is "none",
+    nuclear_questions.json is then built from the NDJSON file, indented
+    ("indent", as before) or without whitespace ("compact").
+    
+    With a checkpoint (see new_checkpoint), progress is saved every
+    CHECKPOINT_INTERVAL questions and when writing is interrupted, and if
+    the checkpoint has completed questions they are kept and the new ones
+    appended after them.
+    
+    Returns:
+        QuestionStream over the written file
+    """
+    ndjson_path = os.path.join(output_dir, QUESTIONS_NDJSON)
+    partial_path = ndjson_path + ".partial"
+    topics = {}
+    count = 0
+    
+    mode = "wb"
+    if checkpoint is not None and checkpoint["completed"]:
+        # Topics in order of first appearance, so reruns are identical
+        for question in QuestionStream(partial_path):
+            topics.setdefault(question["topic"])
+        count = checkpoint["completed"]
+        mode = "ab"
+    
+    with open(partial_path, mode) as f:
+        # Questions written and the file offset after the last of them, set in
+        # one assignment so an interrupt can't separate the two: a line
+        # written but not yet counted lies past the offset and is dropped on
+        # --resume rather than kept and extracted again
+        done = (count, f.tell())
+        try:
+            for question in questions:
+                f.write((json.dumps(question, ensure_ascii=False) + "\n").encode("utf-8"))
+                f.flush()
+                topics.setdefault(question["topic"])
+                done = (done[0] + 1, f.tell())
+                if checkpoint is not None and done[0] % CHECKPOINT_INTERVAL == 0:
+                    save_checkpoint(checkpoint, f, *done, output_dir)
+        except BaseException:
+            # Interrupted (Ctrl-C, a failing page): keep what is done for --resume
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, f, *done, output_dir)
+                logging.info(f"Saved checkpoint after {done[0]} questions, rerun with --resume to continue")
+            raise
+    count = done[0]
+    os.replace(partial_path, ndjson_path)
+    if checkpoint is not None:
+        remove_checkpoint(output_dir)
+    logging.info(f"Extracted {count} questions to {ndjson_path}")
+    
+    questions = QuestionStream(ndjson_path)
+    json_path = os.path.join(output_dir, QUESTIONS_JSON)
+    if json_format == "none":
+        # Don't leave the JSON of an earlier run behind
+        if os.path.exists(json_path):
+            os.remove(json_path)
+    else:
+        write_questions_json(questions, json_path, indent=json_format == "indent")
     
-    # Save topics list
-    topics = list(set(q["topic"] for q in questions))
     topics_file = os.path.join(output_dir, "topics.json")
     with open(topics_file, "w", encoding="utf-8") as f:
-        json.dump(topics, f, ensure_ascii=False, indent=2)
+        json.dump(list(topics), f, ensure_ascii=False, indent=2)
     
     logging.info(f"Found {len(topics)} unique topics")
-    
     return questions
 
-def extract_question_content(soup):
-    """Extract the main question content from the HTML soup."""
-    # Find content between TOPIC and first option (A)
-    content = ""
-    in_question = False
+def write_questions_json(questions, json_path, indent=True):
+    """
+    Write questions as one JSON array, a question at a time.
+    
+    The output is the same as json.dump(list(questions), f, indent=2), or
+    with compact separators when indent is False.
+    """
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        separator = ""
+        for question in questions:
+            if indent:
+                question_json = json.dumps(question, ensure_ascii=False, indent=2)
+                f.write(separator + "\n" + "\n".join("  " + line for line in question_json.split("\n")))
+            else:
+                f.write(separator + json.dumps(question, ensure_ascii=False, separators=(",", ":")))
+            separator = ","
+        f.write("\n]" if indent and separator else "]")
+    os.replace(tmp_path, json_path)
+
+# Checkpoints
+#
+# While a full extraction runs, extraction_checkpoint.json records how many
+# questions of the .partial NDJSON file are safely on disk (and the file's
+# size at that point), along with the PDF's page hashes and the extractor
+# version, so --resume only continues a run of the same PDF and code.
 
-    for element in soup.find_all(['p', 'div']):
-        # Rest of the function's logic...
-        text = element.get_text().strip()
+CHECKPOINT_FILE = "extraction_checkpoint.json"
+CHECKPOINT_INTERVAL = 25  # questions
 
-        # Start extracting after we see "TOPIC:"
-        if not in_question and "TOPIC:" in text:
-            in_question = True
-            continue
+def new_checkpoint(pdf_path, page_hashes):
+    """Checkpoint state for a fresh extraction of pdf_path"""
+    return {
+        "extractor_version": EXTRACTOR_VERSION,
+        "pdf": os.path.basename(pdf_path),
+        "pdf_hash": hashlib.sha256("".join(page_hashes).encode()).hexdigest(),
+        "pages": len(page_hashes),
+        "completed": 0,
+        "offset": 0
+    }
 
-        # Stop when we reach option A
-        if in_question and re.match(r"^[Aa]\.\s*.*", text):
-            break
+def save_checkpoint(checkpoint, partial_file, completed, offset, output_dir):
+    """
+    Sync the partial NDJSON file and record that its first completed questions are done.
+    
+    offset is where the last of them ends in the file.
+    """
+    partial_file.flush()
+    os.fsync(partial_file.fileno())
+    checkpoint.update(completed=completed, offset=offset)
+    
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(checkpoint_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+def resume_checkpoint(checkpoint, output_dir):
+    """
+    Pick up the checkpoint an interrupted run left in output_dir.
+    
+    The saved checkpoint must be for the same PDF and extractor version as
+    checkpoint. The partial NDJSON file is cut back to the last checkpointed
+    question (dropping any line written after it) and checkpoint is updated
+    to match.
+    
+    Returns:
+        Number of pages already done, 0 if there is nothing to resume
+    """
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    partial_path = os.path.join(output_dir, QUESTIONS_NDJSON + ".partial")
+    if not (os.path.exists(checkpoint_path) and os.path.exists(partial_path)):
+        logging.info("No checkpoint to resume from, extracting all pages")
+        return 0
+    
+    with open(checkpoint_path, encoding="utf-8") as f:
+        saved = json.load(f)
+    if (any(saved.get(key) != checkpoint[key] for key in ("extractor_version", "pdf_hash"))
+            or os.path.getsize(partial_path) < saved["offset"]):
+        logging.info("Checkpoint is from a different PDF or extractor version, extracting all pages")
+        return 0
+    
+    with open(partial_path, "r+b") as f:
+        f.truncate(saved["offset"])
+    checkpoint.update(completed=saved["completed"], offset=saved["offset"])
+    return saved["completed"]
+
+def remove_checkpoint(output_dir):
+    """Delete the checkpoint of a run that has finished"""
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+def remove_unused_images(candidates, questions, output_dir):
+    """Delete the candidate image files that no question references any more"""
+    referenced = {image_filename for q in questions for image_filename in q["images"]}
+    for image_filename in set(candidates) - referenced:
+        image_path = os.path.join(output_dir, "images", image_filename)
+        if os.path.exists(image_path):
+            os.remove(image_path)
+
+def compute_page_hashes(pdf_path):
+    """
+    Hash each page's content stream together with the images it draws.
+    
+    Returns a list of hex digests, one per page.
+    """
+    page_hashes = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            digest = hashlib.sha256(page.read_contents())
+            for img in page.get_images(full=True):
+                digest.update(doc.xref_stream_raw(img[0]) or b"")
+            page_hashes.append(digest.hexdigest())
+    return page_hashes
 
-        # Collect the question content
-        if in_question:
-            content += str(element)
+def load_manifest(output_dir):
+    """Load the extraction manifest from a previous run, or None"""
+    manifest_file = os.path.join(output_dir, "extraction_manifest.json")
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(pdf_path, page_hashes, output_dir):
+    """Record the page hashes of this run for the next incremental run"""
+    manifest = {
+        "extractor_version": EXTRACTOR_VERSION,
+        "pdf": os.path.basename(pdf_path),
+        "pages": {str(page_num + 1): page_hash for page_num, page_hash in enumerate(page_hashes)}
+    }
+    manifest_file = os.path.join(output_dir, "extraction_manifest.json")
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+def extract_pages(pdf_path, page_nums, output_dir, workers=1):
+    """Yield the questions on the given pages in page order, extracted in workers processes if workers > 1"""
+    if workers <= 1 or len(page_nums) <= 1:
+        yield from iter_page_questions(pdf_path, page_nums, output_dir)
+        return
+    
+    chunks = split_pages(page_nums, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() yields results in submission order, i.e. page order
+        for chunk, chunk_questions in zip(chunks, executor.map(
+            extract_page_list, repeat(pdf_path), chunks, repeat(output_dir)
+        )):
+            logging.info(f"Processed pages {chunk[0]+1}-{chunk[-1]+1}")
+            yield from chunk_questions
+
+def split_pages(page_nums, workers):
+    """
+    Split the pages into consecutive chunks for the worker processes.
+    
+    Several chunks per worker keep the pool busy when some pages (e.g. ones
+    that need rendering) are slower than others.
+    """
+    chunk_size = max(1, -(-len(page_nums) // (workers * 4)))
+    return [page_nums[start:start + chunk_size] for start in range(0, len(page_nums), chunk_size)]
+
+def extract_page_list(pdf_path, page_nums, output_dir):
+    """Open the PDF and extract the questions on the given pages (for worker processes)"""
+    return list(iter_page_questions(pdf_path, page_nums, output_dir))
+
+def iter_page_questions(pdf_path, page_nums, output_dir):
+    """Open the PDF and yield the questions on the given pages one at a time"""
+    # Image files already saved from this document, by xref, so an image
+    # shared between pages is only extracted once
+    saved_xrefs = {}
+    with fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+        for page_num in page_nums:
+            if page_num % 50 == 0:
+                logging.info(f"Processing page {page_num+1}/{total_pages}")
+            yield extract_page(doc, page_num, output_dir, saved_xrefs)
+
+def extract_page(doc, page_num, output_dir, saved_xrefs=None):
+    """Extract the question on one page"""
+    page = doc[page_num]
+    
+    # Read the page's text once; everything below is derived from it
+    context = build_page_context(page)
+    
+    # Extract topic
+    topic_match = re.search(r"TOPIC:\s*(.*?)(?:\n|$)", context["text"])
+    topic = topic_match.group(1).strip() if topic_match else "Unknown"
+    
+    # Extract answer
+    answer_match = re.search(r"ANSWER:\s*([A-D])\.?", context["text"])
+    answer = answer_match.group(1) if answer_match else None
+    
+    # Find the stem and option boundaries in a single scan of the lines
+    layout = scan_page_lines(context["lines"])
+    
+    # Extract full question text with formatting
+    question_html = extract_question_content(context["lines"], layout)
+    
+    # Extract options A, B, C, D
+    options = extract_options(context["lines"], context["text"], layout)
+    
+    # Extract images if present
+    images = extract_images(doc, page, output_dir, saved_xrefs)
+    
+    # Create question object
+    return {
+        "id": page_num + 1,
+        "topic": topic,
+        "question_html": clean_html(question_html),
+        "options": [clean_html(opt) for opt in options],
+        "answer": answer,
+        "images": images,
+        "page_number": page_num + 1
+    }
+
+# Font names PyMuPDF's HTML output uses for the standard PDF fonts
+STANDARD_FONT_FAMILIES = {
+    "Helvetica": "Arial",
+    "Times": "Times New Roman",
+    "Courier": "Courier New"
+}
+
+def build_page_context(page):
+    """
+    Read a page's text once, as structured spans.
+    
+    Uses a single get_text("dict") pass and builds, for every text line, its
+    plain text and an HTML rendering equivalent to PyMuPDF's HTML output
+    (positioned <p> per line, styled <span> per span, with <b>, <i> and <sup>
+    from the span flags).
+    
+    Returns:
+        Dict with "lines" (list of {"text", "html"}) and the page "text"
+        (one line per text line, like page.get_text())
+    """
+    lines = []
+    page_dict = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)
+    
+    for block in page_dict["blocks"]:
+        for line in block.get("lines", ()):
+            spans = line["spans"]
+            if not spans:
+                continue
+            
+            line_height = max(span["size"] for span in spans)
+            left, baseline = spans[0]["origin"]
+            line_html = (
+                f'<p style="top:{baseline - line_height * 0.8:.1f}pt;'
+                f'left:{left:.1f}pt;line-height:{line_height:.1f}pt">'
+            )
+            line_html += "".join(span_html(span) for span in spans)
+            line_html += "</p>"
+            
+            lines.append({
+                "text": "".join(span["text"] for span in spans),
+                "html": line_html
+            })
+    
+    return {
+        "lines": lines,
+        "text": "".join(line["text"] + "\n" for line in lines)
+    }
+
+def span_html(span):
+    """Render one text span the way PyMuPDF's HTML output does"""
+    flags = span["flags"]
+    
+    # Font family, without subset prefix or style suffix
+    family = span["font"].split("+", 1)[-1]
+    family = STANDARD_FONT_FAMILIES.get(family.split("-", 1)[0], family.rsplit("-", 1)[0])
+    if flags & fitz.TEXT_FONT_MONOSPACED:
+        family += ",monospace"
+    elif flags & fitz.TEXT_FONT_SERIFED:
+        family += ",serif"
+    else:
+        family += ",sans-serif"
+    
+    tags = []
+    if flags & fitz.TEXT_FONT_SUPERSCRIPT:
+        tags.append("sup")
+    if flags & fitz.TEXT_FONT_MONOSPACED:
+        tags.append("tt")
+    if flags & fitz.TEXT_FONT_BOLD:
+        tags.append("b")
+    if flags & fitz.TEXT_FONT_ITALIC:
+        tags.append("i")
+    
+    return (
+        "".join(f"<{tag}>" for tag in tags)
+        + f'<span style="font-family:{family};font-size:{span["size"]:.1f}pt;color:#{span["color"]:06x}">'
+        + html.escape(span["text"], quote=False)
+        + "</span>"
+        + "".join(f"</{tag}>" for tag in reversed(tags))
+    )
+
+OPTION_MARKERS = [(letter, letter + ".") for letter in "ABCD"]
+
+def scan_page_lines(lines):
+    """
+    Walk a page's lines once and record where the stem and options are.
+    
+    Returns a dict with:
+        has_topic: whether any line contains "TOPIC:"
+        stem_end: index of the first line starting with "A." or "a." (the
+            stem is every line before it)
+        option_lines: index of the first line starting with "A.", "B.",
+            "C." and "D."
+        letter_lines: indexes of all lines containing "A.", "B.", "C." and
+            "D." anywhere, in page order
+    """
+    layout = {
+        "has_topic": False,
+        "stem_end": None,
+        "option_lines": {},
+        "letter_lines": {letter: [] for letter in "ABCD"}
+    }
+    
+    for index, line in enumerate(lines):
+        text = line["text"].strip()
+        
+        if "TOPIC:" in text:
+            layout["has_topic"] = True
+        
+        starts_option = len(text) >= 2 and text[1] == "."
+        if starts_option and layout["stem_end"] is None and text[0] in "Aa":
+            layout["stem_end"] = index
+        if starts_option and text[0] in "ABCD":
+            layout["option_lines"].setdefault(text[0], index)
+        
+        for letter, marker in OPTION_MARKERS:
+            if marker in text:
+                layout["letter_lines"][letter].append(index)
+    
+    if layout["stem_end"] is None:
+        layout["stem_end"] = len(lines)
+    return layout
 
-    return content
+def extract_question_content(lines, layout):
+    """Extract the main question content: the page's lines up to option A"""
+    # Pages without a TOPIC: line have no question
+    if not layout["has_topic"]:
+        return ""
+    
+    return "".join(line["html"] for line in lines[:layout["stem_end"]])
 
-def extract_options(soup, page_text):
+def extract_options(lines, page_text, layout):
     """Extract the options (A, B, C, D) with formatting preserved"""
     options = []
     
@@ -139,126 +826,578 @@ def extract_options(soup, page_text):
     for letter, text in option_matches:
         # Clean up the text but preserve formatting
         option_html = ""
+        text = text.strip()
         
-        # Find the corresponding HTML in the soup
-        for element in soup.find_all(['p', 'div']):
-            element_text = element.get_text().strip()
-            if letter + "." in element_text and text.strip() in element_text:
+        # Find the corresponding line among those containing the letter
+        for index in layout["letter_lines"][letter]:
+            if text in lines[index]["text"]:
                 # Remove the option letter prefix
-                element_html = str(element)
-                element_html = re.sub(r"<[^>]*>\s*" + letter + r"\.\s*</[^>]*>", "", element_html)
-                option_html = element_html
+                option_html = re.sub(r"<[^>]*>\s*" + letter + r"\.\s*</[^>]*>", "", lines[index]["html"])
                 break
         
         if not option_html:
             # Fallback to just the text if we couldn't find the HTML
-            option_html = f"<p>{text.strip()}</p>"
+            option_html = f"<p>{text}</p>"
         
         options.append(option_html)
     
     # Make sure we got 4 options - sometimes the regex doesn't catch everything
     if len(options) != 4:
-        # Try an alternate approach
+        # Try an alternate approach: the first line starting with "{letter}."
         options = []
         option_letters = ['A', 'B', 'C', 'D']
         
         for letter in option_letters:
-            # Look for pattern "{letter}. text"
-            for element in soup.find_all(['p', 'div']):
-                element_text = element.get_text().strip()
-                if element_text.startswith(f"{letter}."):
-                    option_text = element_text[len(f"{letter}."):]
-                    options.append(f"<p>{option_text.strip()}</p>")
-                    break
+            index = layout["option_lines"].get(letter)
+            if index is not None:
+                option_text = lines[index]["text"].strip()[len(f"{letter}."):]
+                options.append(f"<p>{option_text.strip()}</p>")
             else:
                 # If not found, add a placeholder
                 options.append(f"<p>Option {letter} (not found)</p>")
     
     return options
 
-def extract_images(doc, page, page_num, output_dir):
-    """Extract and save images from the page"""
+def extract_images(doc, page, output_dir, saved_xrefs=None):
+    """
+    Extract and save images from the page.
+    
+    Images are stored by content hash (see save_image), and saved_xrefs maps
+    xrefs already saved from this document to their file names, so images
+    shared between pages are neither extracted nor written twice.
+    """
     images = []
+    if saved_xrefs is None:
+        saved_xrefs = {}
     
     # Extract images using PyMuPDF
-    for img_index, img in enumerate(page.get_images(full=True)):
+    for img in page.get_images(full=True):
         xref = img[0]
-        base_image = doc.extract_image(xref)
-        image_bytes = base_image["image"]
+        image_filename = saved_xrefs.get(xref)
+        if image_filename is None:
+            base_image = doc.extract_image(xref)
+            image_bytes, ext = base_image["image"], base_image["ext"]
+            if ext not in WEB_IMAGE_FORMATS:
+                pixmap = fitz.Pixmap(doc, xref)
+                if pixmap.colorspace is not None and pixmap.colorspace.n > 3:
+                    pixmap = fitz.Pixmap(fitz.csRGB, pixmap)  # e.g. CMYK
+                image_bytes, ext = pixmap.tobytes("png"), "png"
+            # Saved under their real format's extension
+            image_filename = save_image(image_bytes, ext, output_dir)
+            saved_xrefs[xref] = image_filename
         
-        # Save the image
-        image_filename = f"question_{page_num+1}_img_{img_index+1}.png"
-        image_path = os.path.join(output_dir, "images", image_filename)
-        
-        with open(image_path, "wb") as img_file:
-            img_file.write(image_bytes)
-        
-        images.append(image_filename)
+        if image_filename not in images:
+            images.append(image_filename)
     
-    # If images weren't found through PyMuPDF's get_images(), try alternative approach
-    if not images:
+    # If images weren't found through PyMuPDF's get_images(), try alternative
+    # approach - but only pages with vector drawings can hold a diagram, so
+    # text-only pages are never rendered
+    if not images and has_vector_drawings(page):
         # Try to extract as a page image if there might be figures/diagrams
-        pixmap = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Higher resolution
-        image_bytes = pixmap.tobytes()
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(2, 2), alpha=False)  # Higher resolution
         
-        # Convert to PIL Image for processing
-        pil_img = Image.open(io.BytesIO(image_bytes))
+        # Wrap the raw RGB samples for processing (no PNG encode/decode)
+        pil_img = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
         
-        # Save only if it seems to have useful content (e.g., diagrams)
-        # This is a simplified heuristic - you might need to adjust
-        if has_diagram_content(pil_img):
-            image_filename = f"question_{page_num+1}_full_page.png"
-            image_path = os.path.join(output_dir, "images", image_filename)
-            pil_img.save(image_path)
-            images.append(image_filename)
+        # Save only if it seems to have useful content (e.g., diagrams),
+        # cropped to the region that has content
+        content_box = find_diagram_content(pil_img)
+        if content_box:
+            buffer = io.BytesIO()
+            pil_img.crop(pad_box(content_box, DIAGRAM_CROP_MARGIN, pil_img.width, pil_img.height)).save(buffer, "PNG")
+            images.append(save_image(buffer.getvalue(), "png", output_dir))
     
     return images
 
-def has_diagram_content(img):
+# Image files are named after this many hex digits of their SHA-256
+IMAGE_HASH_LENGTH = 16
+CONTENT_ADDRESSED_NAME = re.compile(r"^[0-9a-f]{%d}\.\w+$" % IMAGE_HASH_LENGTH)
+
+def save_image(image_bytes, ext, output_dir):
+    """
+    Save image bytes under a name derived from their content; return the name.
+    
+    Identical images (e.g. a figure reused on several pages) are stored once,
+    and a name always refers to the same bytes, so clients can cache it.
+    """
+    image_filename = f"{hashlib.sha256(image_bytes).hexdigest()[:IMAGE_HASH_LENGTH]}.{ext}"
+    image_path = os.path.join(output_dir, "images", image_filename)
+    
+    if not os.path.exists(image_path):
+        # Write under a temporary name first, so a concurrent worker saving the
+        # same image never sees a partial file
+        tmp_path = f"{image_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as img_file:
+            img_file.write(image_bytes)
+        os.replace(tmp_path, image_path)
+    
+    return image_filename
+
+def migrate_image_store(output_dir, json_format="indent", db_path=None):
+    """
+    Move images saved under per-question names (question_<n>_img_<i>.png)
+    into the content-addressed store and update the question files.
+    
+    Files get the extension of their real format (earlier versions named
+    JPEGs .png), and duplicate files collapse into one. The old files are
+    only removed once the question files, and the database at db_path if
+    given (rebuilt from the updated questions), refer to the new names.
+    Returns the updated questions.
+    """
+    questions = list(load_questions(output_dir))
+    
+    renamed = {}
+    stale_paths = []
+    for question in questions:
+        new_images = []
+        for image_filename in question["images"]:
+            if image_filename not in renamed:
+                image_path = os.path.join(output_dir, "images", image_filename)
+                if not os.path.exists(image_path):
+                    logging.warning(f"Image {image_filename} of question {question['id']} not found")
+                    renamed[image_filename] = image_filename
+                else:
+                    with open(image_path, "rb") as img_file:
+                        image_bytes = img_file.read()
+                    ext = os.path.splitext(image_filename)[1].lstrip(".") or "png"
+                    renamed[image_filename] = save_image(image_bytes, detect_image_format(image_bytes, ext), output_dir)
+                    if renamed[image_filename] != image_filename:
+                        stale_paths.append(image_path)
+            
+            if renamed[image_filename] not in new_images:
+                new_images.append(renamed[image_filename])
+        question["images"] = new_images
+    
+    questions = write_questions(questions, output_dir, json_format)
+    if db_path:
+        create_sqlite_database(questions, db_path, load_sources(output_dir))
+    for image_path in stale_paths:
+        os.remove(image_path)
+    logging.info(
+        f"Migrated {len(renamed)} images to {len(set(renamed.values()))} content-addressed files"
+    )
+    return questions
+
+# Image formats browsers can display; anything else an extracted image comes
+# in (JPEG 2000, JBIG2, ...) is converted to PNG
+WEB_IMAGE_FORMATS = {"png", "jpeg", "gif", "webp"}
+
+def detect_image_format(image_bytes, default=None):
+    """Real format of encoded image bytes (e.g. "jpeg"), whatever their file name says"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.format.lower()
+    except Exception:
+        return default
+
+# Responsive variants
+#
+# For each stored image a smaller copy is made at every width in
+# VARIANT_WIDTHS (below the original's), plus one at full size, in WebP and
+# in the original's own family (optimized PNG, or JPEG for photos). The
+# backend picks one per request from the Accept header and a ?w= parameter.
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANTS_DIR = "variants"
+VARIANTS_MANIFEST = "manifest.json"
+JPEG_VARIANT_QUALITY = 85
+WEBP_VARIANT_QUALITY = 80
+
+def generate_image_variants(output_dir, workers=1, widths=VARIANT_WIDTHS):
     """
-    Basic heuristic to determine if an image likely contains diagrams.
-    This is just a simplified example - real implementation would be more sophisticated.
+    Build the responsive variants of every image the questions use.
+    
+    Images are processed in workers processes. Variants that are already up
+    to date are kept, variants of images no longer used are deleted, and
+    images/variants/manifest.json lists what was generated for each image.
+    
+    Returns:
+        The manifest dict
+    """
+    from PIL import features
+    
+    images_dir = os.path.join(output_dir, "images")
+    variants_dir = os.path.join(images_dir, VARIANTS_DIR)
+    os.makedirs(variants_dir, exist_ok=True)
+    
+    image_filenames = sorted({
+        image_filename for q in load_questions(output_dir) for image_filename in q["images"]
+        if os.path.exists(os.path.join(images_dir, image_filename))
+    })
+    
+    formats = ["webp"] if features.check("webp") else []
+    if not formats:
+        logging.warning("Pillow was built without WebP support, only generating PNG/JPEG variants")
+    
+    if workers > 1 and len(image_filenames) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            entries = list(executor.map(
+                make_image_variants, repeat(images_dir), image_filenames, repeat(tuple(widths)),
+                repeat(tuple(formats)), chunksize=8
+            ))
+    else:
+        entries = [make_image_variants(images_dir, image_filename, widths, formats) for image_filename in image_filenames]
+    
+    manifest = {"widths": list(widths), "images": dict(zip(image_filenames, entries))}
+    
+    # Drop variants of images that are gone (variant names start with the image's stem)
+    stems = {os.path.splitext(image_filename)[0] for image_filename in image_filenames}
+    for variant_filename in os.listdir(variants_dir):
+        if variant_filename != VARIANTS_MANIFEST and variant_filename.split(".")[0] not in stems:
+            os.remove(os.path.join(variants_dir, variant_filename))
+    
+    with open(os.path.join(variants_dir, VARIANTS_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    
+    # Bytes a client asking for the smallest width would download
+    original_bytes = smallest_bytes = 0
+    for entry in entries:
+        original_bytes += entry["bytes"]
+        smallest_bytes += min(
+            [variant["bytes"] for variant in entry["variants"] if variant["width"] == min(widths[0], entry["width"])],
+            default=entry["bytes"]
+        )
+    logging.info(
+        f"Generated variants of {len(entries)} images: {original_bytes / 1e6:.1f} MB of originals, "
+        f"{smallest_bytes / 1e6:.1f} MB at {widths[0]}px"
+    )
+    return manifest
+
+def make_image_variants(images_dir, image_filename, widths, formats):
+    """
+    Write the variants of one image and return its manifest entry.
+    
+    A full-size variant is only kept if it is smaller than the original, and
+    a WebP variant only if it is smaller than the PNG/JPEG one of the same
+    width. Existing variant files newer than the image are reused.
+    """
+    image_path = os.path.join(images_dir, image_filename)
+    variants_dir = os.path.join(images_dir, VARIANTS_DIR)
+    stem = os.path.splitext(image_filename)[0]
+    original_bytes = os.path.getsize(image_path)
+    original_mtime = os.path.getmtime(image_path)
+    
+    with Image.open(image_path) as source:
+        source_format = source.format.lower()
+        if source.mode in ("RGB", "RGBA", "L"):
+            img = source.copy()
+        else:
+            img = source.convert("RGBA" if source.mode in ("LA", "PA") or "transparency" in source.info else "RGB")
+    width, height = img.size
+    
+    # Photos stay JPEG, everything else (diagrams, line art) becomes PNG
+    fallback_format = "jpeg" if source_format == "jpeg" and img.mode != "RGBA" else "png"
+    
+    variants = []
+    for target_width in [w for w in widths if w < width] + [width]:
+        resized = None
+        size_limit = original_bytes if target_width == width else None
+        for variant_format in [fallback_format] + list(formats):
+            variant_filename = f"{stem}.{target_width}w.{variant_format}"
+            variant_path = os.path.join(variants_dir, variant_filename)
+            
+            if not (os.path.exists(variant_path) and os.path.getmtime(variant_path) >= original_mtime):
+                if resized is None:
+                    resized = img if target_width == width else img.resize(
+                        (target_width, max(1, round(height * target_width / width))), Image.LANCZOS
+                    )
+                buffer = io.BytesIO()
+                if variant_format == "jpeg":
+                    resized.save(buffer, "JPEG", quality=JPEG_VARIANT_QUALITY, optimize=True, progressive=True)
+                elif variant_format == "png":
+                    resized.save(buffer, "PNG", optimize=True)
+                else:
+                    # Lossless keeps diagram lines and text sharp; photos can be lossy
+                    resized.save(buffer, "WEBP", lossless=fallback_format == "png",
+                                 quality=WEBP_VARIANT_QUALITY, method=4)
+                tmp_path = f"{variant_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as variant_file:
+                    variant_file.write(buffer.getvalue())
+                os.replace(tmp_path, variant_path)
+            
+            variant_bytes = os.path.getsize(variant_path)
+            if size_limit is not None and variant_bytes >= size_limit:
+                # Not worth serving, a smaller option exists (the file is kept
+                # so the next run doesn't encode it again)
+                continue
+            variants.append({
+                "file": variant_filename,
+                "width": target_width,
+                "format": variant_format,
+                "bytes": variant_bytes
+            })
+            size_limit = variant_bytes if size_limit is None else min(size_limit, variant_bytes)
+    
+    return {
+        "format": source_format,
+        "width": width,
+        "height": height,
+        "bytes": original_bytes,
+        "variants": variants
+    }
+
+# Drawings whose combined bounding box covers less than this fraction of the
+# page (rules, underlines, table borders on a single line) can't be a diagram
+MIN_DRAWING_AREA_FRACTION = 0.01
+
+def has_vector_drawings(page):
+    """Cheap check, without rendering, for vector graphics that could form a diagram"""
+    drawings = page.get_drawings()
+    if not drawings:
+        return False
+    
+    drawing_box = fitz.Rect(drawings[0]["rect"])
+    for drawing in drawings[1:]:
+        drawing_box |= drawing["rect"]
+    drawing_box &= page.rect
+    return drawing_box.width * drawing_box.height >= (
+        page.rect.width * page.rect.height * MIN_DRAWING_AREA_FRACTION
+    )
+
+# Grayscale level below which a pixel counts as content rather than paper
+CONTENT_LEVEL = 240
+# A rendered page is kept as a diagram if more than this fraction is content
+DIAGRAM_MIN_FRACTION = 0.05
+# Margin (in pixels) kept around the content when cropping a rendered page
+DIAGRAM_CROP_MARGIN = 8
+# Maps grayscale levels to a content mask: 255 for content, 0 for paper
+CONTENT_MASK_TABLE = [255 if level < CONTENT_LEVEL else 0 for level in range(256)]
+
+def content_fraction(gray_img):
+    """Fraction of non-white pixels in a grayscale image, from its histogram"""
+    histogram = gray_img.histogram()
+    return sum(histogram[:CONTENT_LEVEL]) / (gray_img.width * gray_img.height)
+
+def find_diagram_content(img, probe_scale=4):
+    """
+    Heuristic to determine if an image likely contains diagrams, and where.
+    
+    Non-white pixels are counted with a grayscale histogram. A nearest-
+    neighbour probe at 1/probe_scale resolution settles clear cases first;
+    only images whose probe is near the threshold are counted in full.
+    
+    Returns:
+        Bounding box (left, upper, right, lower) of the non-white region if
+        more than 5% of the image is non-white, otherwise None
     """
     # Convert to grayscale for analysis
     gray_img = img.convert('L')
     
-    # Count non-white pixels
-    non_white_pixels = sum(1 for pixel in gray_img.getdata() if pixel < 240)
-    total_pixels = gray_img.width * gray_img.height
+    probe = gray_img.resize(
+        (max(1, gray_img.width // probe_scale), max(1, gray_img.height // probe_scale)),
+        Image.NEAREST
+    )
+    fraction = content_fraction(probe)
+    if fraction < DIAGRAM_MIN_FRACTION / 2:
+        return None
+    if fraction < DIAGRAM_MIN_FRACTION * 2 and content_fraction(gray_img) <= DIAGRAM_MIN_FRACTION:
+        return None
     
-    # If more than 5% non-white, likely has content
-    return non_white_pixels > (total_pixels * 0.05)
+    return gray_img.point(CONTENT_MASK_TABLE).getbbox()
+
+def pad_box(box, margin, width, height):
+    """Grow a bounding box by margin pixels on each side, within the image"""
+    left, upper, right, lower = box
+    return (max(0, left - margin), max(0, upper - margin), min(width, right + margin), min(height, lower + margin))
+
+# Everything clean_html looks at, in one pattern for a single pass. Runs of
+# markup (and fractions marked on an earlier run) are matched only to be
+# skipped, so tags and attribute values are never rewritten. Every
+# alternative starts with a plain character, which lets the regex engine
+# skip quickly to the next candidate.
+CLEAN_HTML_TOKENS = re.compile(
+    r'(?P<markup>(?:<span class="fraction">[^<]*</span>|<[^>]*>)+)'
+    # Whitespace (including &nbsp;) other than a single space
+    r'|(?P<space>[^\S ](?:\s|&nbsp;)*|&nbsp;(?:\s|&nbsp;)*| (?:\s|&nbsp;)+)'
+    # A plain number/number, not part of a date, decimals or a word
+    r'|(?P<fraction>\d(?<![\w/.,]\d)\d*/\d+(?![\w/]|[.,]\d))'
+)
+
+def clean_html_token(match):
+    """Replacement for one CLEAN_HTML_TOKENS match"""
+    kind = match.lastgroup
+    if kind == "markup":
+        return match.group()
+    if kind == "space":
+        return " "
+    return f'<span class="fraction">{match.group()}</span>'
 
 def clean_html(html_content):
-    """Clean HTML content while preserving formatting"""
+    """
+    Clean HTML content while preserving formatting.
+    
+    In the text between tags, runs of whitespace become one space and plain
+    fractions such as 1/4 are marked up. Tags and their attributes are left
+    as they are.
+    """
     if not html_content:
         return ""
     
-    # Remove excessive whitespace but preserve tags
-    html_content = re.sub(r'\s+', ' ', html_content)
+    return CLEAN_HTML_TOKENS.sub(clean_html_token, html_content)
+
+# Tags normalize_html keeps (without their attributes); any other tag is
+# dropped and its text kept, except the fraction spans added by clean_html
+INLINE_TAGS = {"b", "i", "sub", "sup", "br"}
+FRACTION_CLASS = "fraction"
+TABLE_TAGS = {"table", "thead", "tbody", "tr", "th", "td"}
+TABLE_CELL_ATTRIBUTES = ("colspan", "rowspan")
+# Block tags PyMuPDF emits one per text line
+LINE_TAGS = {"p", "div"}
+
+EMPTY_INLINE_TAG = re.compile(r"<(b|i|sub|sup)>(\s*)</\1>")
+ADJACENT_INLINE_TAGS = re.compile(r"</(b|i|sub|sup)>(\s*)<\1>")
+# Whitespace at the start or end of a line, also inside its formatting tags
+LINE_EDGE_SPACE = re.compile(r"^((?:<\w+>)*)\s+|\s+((?:</\w+>)*)$")
+
+class HTMLNormalizer(HTMLParser):
+    """
+    Collect the lines of an HTML fragment as minimal markup.
+    
+    Every <p>/<div> is a line; lines without text are dropped. Inline
+    formatting in INLINE_TAGS, fraction spans and tables are kept without
+    other attributes, everything else (positioned <p> styles, <span>
+    fonts, images) is dropped.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []     # list of ("line", html) or ("table", html)
+        self.line = []       # html pieces of the current line
+        self.has_text = False
+        self.line_depth = 0  # open <p>/<div> elements
+        self.spans = []      # for each open <span>, whether it is kept
+        self.table = None    # html pieces of the current table, if inside one
+        self.table_depth = 0
+    
+    def end_line(self):
+        """Finish the current line, keeping it if it has any text"""
+        if self.has_text:
+            line = re.sub(r" {2,}", " ", "".join(self.line))
+            self.blocks.append(("line", LINE_EDGE_SPACE.sub(r"\1\2", line)))
+        self.line = []
+        self.has_text = False
     
-    # Ensure subscripts and superscripts are properly formatted
-    html_content = re.sub(r'<sub>(.*?)</sub>', r'<sub>\1</sub>', html_content)
-    html_content = re.sub(r'<sup>(.*?)</sup>', r'<sup>\1</sup>', html_content)
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            if self.table_depth == 0:
+                self.end_line()
+                self.table = []
+            self.table_depth += 1
+        if tag in TABLE_TAGS and self.table_depth:
+            kept = "".join(
+                f' {name}="{html.escape(value)}"' for name, value in attrs
+                if name in TABLE_CELL_ATTRIBUTES and value
+            )
+            self.table.append(f"<{tag}{kept}>")
+        elif tag in LINE_TAGS and not self.table_depth:
+            self.end_line()
+            self.line_depth += 1
+        elif tag in INLINE_TAGS:
+            (self.table if self.table_depth else self.line).append(f"<{tag}>")
+        elif tag == "span":
+            self.spans.append(dict(attrs).get("class") == FRACTION_CLASS)
+            if self.spans[-1]:
+                (self.table if self.table_depth else self.line).append(f'<span class="{FRACTION_CLASS}">')
     
-    # Fix common formatting issues
-    # Convert plain text fractions to proper HTML
-    html_content = re.sub(r'(\d+)/(\d+)', r'<span class="fraction">\1/\2</span>', html_content)
+    def handle_endtag(self, tag):
+        if tag in TABLE_TAGS and self.table_depth:
+            self.table.append(f"</{tag}>")
+            if tag == "table":
+                self.table_depth -= 1
+                if self.table_depth == 0:
+                    self.blocks.append(("table", "".join(self.table)))
+                    self.table = None
+        elif tag in LINE_TAGS and not self.table_depth:
+            self.end_line()
+            self.line_depth = max(0, self.line_depth - 1)
+        elif tag in INLINE_TAGS and tag != "br":
+            (self.table if self.table_depth else self.line).append(f"</{tag}>")
+        elif tag == "span" and self.spans:
+            if self.spans.pop():
+                (self.table if self.table_depth else self.line).append("</span>")
     
-    # Fix special characters
-    html_content = html_content.replace('&nbsp;', ' ')
+    def handle_data(self, data):
+        text = html.escape(data, quote=False)
+        if self.table_depth:
+            self.table.append(text)
+        elif self.line_depth or data.strip():
+            # Whitespace between lines is not a line of its own
+            self.line.append(text)
+            self.has_text = self.has_text or bool(data.strip())
     
-    return html_content
+    def close(self):
+        super().close()
+        if self.table_depth:
+            # Unterminated table: keep what there is
+            self.blocks.append(("table", "".join(self.table)))
+            self.table_depth = 0
+        self.end_line()
 
-def create_sqlite_database(questions, db_path):
-    """Create an SQLite database from the extracted questions"""
-    import sqlite3
+def normalize_html(html_content):
+    """
+    Reduce extracted HTML to minimal semantic markup.
     
-    # Connect to the database (will create if it doesn't exist)
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    PyMuPDF's positional markup (an absolutely positioned <p> per text line
+    with a styled <span> per text run) becomes a plain <p> per line, so the
+    text still breaks where it did on the page. Blank lines, images, the
+    TOPIC header at the top of a question and all attributes are dropped;
+    <b>, <i>, <sub>, <sup>, tables and fractions are kept.
+    """
+    if not html_content:
+        return ""
+    
+    parser = HTMLNormalizer()
+    parser.feed(html_content)
+    parser.close()
+    blocks = parser.blocks
+    
+    # The TOPIC header duplicates the question's topic field; PyMuPDF puts
+    # the topic name on a line of its own after a bare "TOPIC:"
+    if blocks and blocks[0][0] == "line" and blocks[0][1].startswith("TOPIC:"):
+        header_lines = 2 if blocks[0][1] == "TOPIC:" else 1
+        blocks = blocks[header_lines:]
+    
+    parts = []
+    for kind, content in blocks:
+        if kind == "table":
+            parts.append(content)
+            continue
+        # Consecutive runs with the same formatting become one element
+        previous = None
+        while previous != content:
+            previous = content
+            content = EMPTY_INLINE_TAG.sub(r"\2", ADJACENT_INLINE_TAGS.sub(r"\2", content))
+        parts.append(f"<p>{content}</p>")
+    return "".join(parts)
+
+def normalize_questions(questions):
+    """
+    Normalize the question and option HTML of each question as it passes
+    through, logging the size reduction once all have been yielded.
+    """
+    before = after = 0
+    for question in questions:
+        before += len(question["question_html"]) + sum(len(option) for option in question["options"])
+        question["question_html"] = normalize_html(question["question_html"])
+        question["options"] = [normalize_html(option) for option in question["options"]]
+        after += len(question["question_html"]) + sum(len(option) for option in question["options"])
+        yield question
+    
+    if before:
+        logging.info(
+            f"Normalized question HTML: {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB "
+            f"({1 - after / before:.0%} smaller)"
+        )
+
+def create_tables(cursor):
+    """Create the quiz database tables"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sources (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE,
+        pages INTEGER
+    )
+    ''')
     
-    # Create tables
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS topics (
         id INTEGER PRIMARY KEY,
@@ -273,7 +1412,9 @@ def create_sqlite_database(questions, db_path):
         question_html TEXT,
         answer TEXT,
         page_number INTEGER,
-        FOREIGN KEY (topic_id) REFERENCES topics (id)
+        source_id INTEGER DEFAULT 0,
+        FOREIGN KEY (topic_id) REFERENCES topics (id),
+        FOREIGN KEY (source_id) REFERENCES sources (id)
     )
     ''')
     
@@ -296,72 +1437,319 @@ def create_sqlite_database(questions, db_path):
     )
     ''')
     
-    # Insert topics
-    topics = set(q["topic"] for q in questions)
-    topic_id_map = {}
-    
-    for topic in topics:
-        cursor.execute('INSERT OR IGNORE INTO topics (name) VALUES (?)', (topic,))
-        cursor.execute('SELECT id FROM topics WHERE name = ?', (topic,))
-        topic_id = cursor.fetchone()[0]
-        topic_id_map[topic] = topic_id
-    
-    # Insert questions, options, and images
-    for q in questions:
-        cursor.execute('''
-        INSERT INTO questions (id, topic_id, question_html, answer, page_number)
-        VALUES (?, ?, ?, ?, ?)
+    # Per-topic counts for the backend's stats endpoints (see refresh_topic_stats)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS topic_stats (
+        topic_id INTEGER PRIMARY KEY,
+        name TEXT,
+        question_count INTEGER,
+        with_images INTEGER,
+        missing_answers INTEGER,
+        FOREIGN KEY (topic_id) REFERENCES topics (id)
+    )
+    ''')
+    
+    # Databases built before batch ingestion have no source column
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(questions)')}
+    if "source_id" not in columns:
+        cursor.execute('ALTER TABLE questions ADD COLUMN source_id INTEGER DEFAULT 0')
+
+def refresh_topic_stats(cursor):
+    """
+    Recompute the topic_stats summary table from the questions.
+    
+    Each topic gets its question count and how many of its questions have
+    images or no answer, so the backend's stats and count endpoints read a
+    handful of rows instead of scanning the questions.
+    """
+    cursor.execute('DELETE FROM topic_stats')
+    cursor.execute('''
+    INSERT INTO topic_stats (topic_id, name, question_count, with_images, missing_answers)
+    SELECT t.id, t.name, COUNT(DISTINCT q.id), COUNT(DISTINCT i.question_id),
+           COUNT(DISTINCT CASE WHEN COALESCE(q.answer, '') = '' THEN q.id END)
+    FROM topics t
+    LEFT JOIN questions q ON q.topic_id = t.id
+    LEFT JOIN images i ON i.question_id = q.id
+    GROUP BY t.id
+    ''')
+
+def insert_sources(cursor, sources):
+    """Replace the rows of the sources table"""
+    cursor.execute('DELETE FROM sources')
+    cursor.executemany(
+        'INSERT INTO sources (id, name, pages) VALUES (?, ?, ?)',
+        ((source["id"], source["name"], source["pages"]) for source in sources)
+    )
+
+def create_indexes(cursor):
+    """
+    Create indexes matching the backend's query shapes.
+    
+    The options and images indexes carry the selected columns, so
+    per-question lookups are answered from the index alone.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_questions_topic ON questions (topic_id)')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_options_question
+    ON options (question_id, option_letter, option_html)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_images_question
+    ON images (question_id, id, image_path)
+    ''')
+
+# Questions are inserted in batches of this many, so a stream of questions
+# is read once without holding more than a batch in memory
+INSERT_BATCH_SIZE = 500
+
+def insert_questions(cursor, questions, topic_id_map):
+    """
+    Insert questions with their options and images using executemany.
+    
+    questions may be any iterable (e.g. a QuestionStream); it is read once.
+    Returns the number of questions inserted.
+    """
+    option_letters = ['A', 'B', 'C', 'D']
+    count = 0
+    questions = iter(questions)
+    
+    while True:
+        batch = list(islice(questions, INSERT_BATCH_SIZE))
+        if not batch:
+            return count
+        count += len(batch)
+        
+        cursor.executemany('''
+        INSERT INTO questions (id, topic_id, question_html, answer, page_number, source_id)
+        VALUES (?, ?, ?, ?, ?, ?)
         ''', (
-            q["id"],
-            topic_id_map[q["topic"]],
-            q["question_html"],
-            q["answer"],
-            q["page_number"]
+            (q["id"], topic_id_map[q["topic"]], q["question_html"], q["answer"], q["page_number"],
+             q.get("source_id", 0))
+            for q in batch
         ))
         
-        # Insert options
-        option_letters = ['A', 'B', 'C', 'D']
-        for i, option_html in enumerate(q["options"]):
-            if i < len(option_letters):
-                cursor.execute('''
-                INSERT INTO options (question_id, option_letter, option_html)
-                VALUES (?, ?, ?)
-                ''', (
-                    q["id"],
-                    option_letters[i],
-                    option_html
-                ))
+        cursor.executemany('''
+        INSERT INTO options (question_id, option_letter, option_html)
+        VALUES (?, ?, ?)
+        ''', (
+            (q["id"], letter, option_html)
+            for q in batch
+            for letter, option_html in zip(option_letters, q["options"])
+        ))
         
-        # Insert images
-        for image_path in q["images"]:
-            cursor.execute('''
-            INSERT INTO images (question_id, image_path)
-            VALUES (?, ?)
-            ''', (
-                q["id"],
-                image_path
-            ))
+        cursor.executemany('''
+        INSERT INTO images (question_id, image_path)
+        VALUES (?, ?)
+        ''', (
+            (q["id"], image_path)
+            for q in batch
+            for image_path in q["images"]
+        ))
+
+def remove_database_files(db_path):
+    """Delete a database file along with any journal files next to it"""
+    for path in (db_path, db_path + "-journal", db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def build_database(db_path, build, base_path=None):
+    """
+    Build a database in a temporary file and atomically rename it to db_path.
+    
+    build(cursor) runs inside a single transaction on a copy of base_path
+    (or an empty database), after which the topic_stats summary is
+    recomputed. A running backend never sees a half-written file: it keeps
+    reading the old database until the rename.
+    """
+    import sqlite3
+    
+    tmp_path = db_path + ".tmp"
+    remove_database_files(tmp_path)
+    if base_path:
+        shutil.copyfile(base_path, tmp_path)
+    
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    cursor = conn.cursor()
+    
+    try:
+        # The temporary file is thrown away if the build fails, so there is
+        # nothing to protect with a journal or synced writes
+        cursor.execute('PRAGMA journal_mode = OFF')
+        cursor.execute('PRAGMA synchronous = OFF')
+        
+        cursor.execute('BEGIN')
+        create_tables(cursor)
+        build(cursor)
+        refresh_topic_stats(cursor)
+        
+        # Indexes are cheaper to build once the rows are in place
+        create_indexes(cursor)
+        cursor.execute('COMMIT')
+        
+        # Gather statistics for the query planner
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+        cursor.execute('PRAGMA journal_mode = DELETE')
+    except Exception:
+        conn.close()
+        remove_database_files(tmp_path)
+        raise
     
-    conn.commit()
     conn.close()
-    logging.info(f"Created SQLite database at {db_path}")
+    
+    # Make sure the data is on disk before the new file becomes visible
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, db_path)
+
+def create_sqlite_database(questions, db_path, sources=()):
+    """
+    Create an SQLite database from the extracted questions.
+    
+    The database is bulk-loaded into a temporary file in a single transaction
+    and then renamed over db_path. Each run builds the whole database from
+    scratch, so re-running replaces the previous database instead of failing
+    on duplicate question IDs.
+    
+    questions may be a QuestionStream: it is read twice (topics, then rows)
+    and never loaded whole. sources fill the sources table (see
+    load_sources).
+    """
+    count = 0
+    
+    def build(cursor):
+        nonlocal count
+        # Insert topics, numbered in name order
+        topic_id_map = {topic: i + 1 for i, topic in enumerate(sorted(set(q["topic"] for q in questions)))}
+        cursor.executemany(
+            'INSERT INTO topics (id, name) VALUES (?, ?)',
+            ((topic_id, topic) for topic, topic_id in topic_id_map.items())
+        )
+        
+        insert_sources(cursor, sources)
+        
+        # Insert questions, options, and images
+        count = insert_questions(cursor, questions, topic_id_map)
+    
+    build_database(db_path, build)
+    logging.info(f"Created SQLite database at {db_path} ({count} questions)")
+
+def update_sqlite_database(changed_questions, removed_ids, db_path, sources=()):
+    """
+    Apply an incremental extraction to an existing database.
+    
+    Rows of changed and removed questions are replaced on a copy of the
+    database, which is then swapped in like a full build.
+    """
+    def build(cursor):
+        # Delete the old rows of every question that changed or disappeared
+        stale_ids = [(q["id"],) for q in changed_questions] + [(qid,) for qid in removed_ids]
+        cursor.executemany('DELETE FROM images WHERE question_id = ?', stale_ids)
+        cursor.executemany('DELETE FROM options WHERE question_id = ?', stale_ids)
+        cursor.executemany('DELETE FROM questions WHERE id = ?', stale_ids)
+        
+        # Add any new topics, keeping the IDs of existing ones
+        cursor.executemany(
+            'INSERT OR IGNORE INTO topics (name) VALUES (?)',
+            ((topic,) for topic in sorted(set(q["topic"] for q in changed_questions)))
+        )
+        topic_id_map = {name: topic_id for topic_id, name in cursor.execute('SELECT id, name FROM topics')}
+        
+        insert_questions(cursor, changed_questions, topic_id_map)
+        insert_sources(cursor, sources)
+        cursor.execute('DELETE FROM topics WHERE id NOT IN (SELECT topic_id FROM questions)')
+    
+    build_database(db_path, build, base_path=db_path)
+    logging.info(
+        f"Updated SQLite database at {db_path} "
+        f"({len(changed_questions)} questions replaced, {len(removed_ids)} removed)"
+    )
 
 if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="Extract nuclear engineering questions from PDF")
-    parser.add_argument("pdf_path", help="Path to the PDF file")
+    parser.add_argument("pdf_path", nargs="?", help="Path to the PDF file")
     parser.add_argument("--output-dir", default="extracted_data", help="Directory to save extracted data")
     parser.add_argument("--create-db", action="store_true", help="Create SQLite database")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to extract pages with")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-extract pages that changed since the last run")
+    parser.add_argument("--migrate-images", action="store_true",
+                        help="Move existing per-question image files to the content-addressed store "
+                             "(rebuilds the database in --output-dir if there is one)")
+    parser.add_argument("--normalize-html", action="store_true",
+                        help="Strip positional markup from the HTML of an existing extraction")
+    parser.add_argument("--batch", nargs="+", metavar="PDF_OR_DIR",
+                        help="Ingest several PDFs (or directories of PDFs) into one question bank, "
+                             "--workers of them at a time")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted extraction from its last checkpoint")
+    parser.add_argument("--json", choices=JSON_FORMATS, default="indent", dest="json_format",
+                        help="Format of nuclear_questions.json built from the NDJSON output ('none' to skip it)")
+    parser.add_argument("--image-variants", action="store_true",
+                        help="Generate resized WebP/PNG/JPEG variants of the images for the backend to serve")
     
     args = parser.parse_args()
+    standalone_steps = args.migrate_images or args.normalize_html or args.image_variants
+    if not args.pdf_path and not args.batch and (args.incremental or not standalone_steps):
+        parser.error("the following arguments are required: pdf_path")
+    if args.resume and args.incremental:
+        parser.error("--resume only applies to full extractions, not --incremental")
+    if args.batch:
+        if args.pdf_path:
+            parser.error("pdf_path can't be combined with --batch, list every PDF after --batch")
+        args.batch = find_pdfs(args.batch)
+        names = [os.path.basename(pdf_path) for pdf_path in args.batch]
+        if not names:
+            parser.error("--batch found no PDFs")
+        if len(set(names)) != len(names):
+            parser.error("--batch PDFs must have different file names")
+    db_path = os.path.join(args.output_dir, "nuclear_quiz.db")
     
-    # Extract questions
-    questions = extract_questions_from_pdf(args.pdf_path, args.output_dir)
+    if args.batch:
+        # Extract the PDFs side by side and merge them into the bank
+        questions, sources = ingest_pdfs(
+            args.batch, args.output_dir, workers=args.workers, incremental=args.incremental,
+            resume=args.resume, json_format=args.json_format
+        )
+        if args.create_db:
+            create_sqlite_database(questions, db_path, sources)
+    elif args.migrate_images:
+        # Rename the images of an earlier extraction and point the outputs at
+        # them; an existing database is rebuilt too, as it lists the old names
+        migrate_db = args.create_db or os.path.exists(db_path)
+        questions = migrate_image_store(args.output_dir, args.json_format, db_path if migrate_db else None)
+    elif args.normalize_html:
+        # Bring the HTML of an earlier extraction to the current format
+        questions = write_questions(
+            normalize_questions(load_questions(args.output_dir)), args.output_dir, args.json_format
+        )
+        if args.create_db:
+            create_sqlite_database(questions, db_path, load_sources(args.output_dir))
+    elif args.incremental:
+        # Extract changed pages and patch the existing outputs
+        questions, changed_questions, removed_ids = update_questions_from_pdf(
+            args.pdf_path, args.output_dir, workers=args.workers, json_format=args.json_format
+        )
+        if args.create_db:
+            sources = load_sources(args.output_dir)
+            if not os.path.exists(db_path) or len(changed_questions) == len(questions):
+                create_sqlite_database(questions, db_path, sources)
+            elif changed_questions or removed_ids:
+                update_sqlite_database(changed_questions, removed_ids, db_path, sources)
+    elif args.pdf_path:
+        # Extract questions
+        questions = extract_questions_from_pdf(
+            args.pdf_path, args.output_dir, workers=args.workers, json_format=args.json_format,
+            resume=args.resume
+        )
+        
+        # Create database if requested
+        if args.create_db:
+            create_sqlite_database(questions, db_path, load_sources(args.output_dir))
     
-    # Create database if requested
-    if args.create_db:
-        db_path = os.path.join(args.output_dir, "nuclear_quiz.db")
-        create_sqlite_database(questions, db_path)
+    if args.image_variants:
+        generate_image_variants(args.output_dir, workers=args.workers)
         
     logging.info("Extraction completed successfully")
\ No newline at end of file
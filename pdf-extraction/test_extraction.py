@@ -0,0 +1,480 @@
+# pdf-extraction/test_extraction.py
+import os
+import sys
+import pytest
+
+QUESTIONS_FILE = os.path.join(os.path.dirname(__file__), "extracted_data", "nuclear_questions.json")
+
+def load_extraction_module():
+    import importlib.util
+    path = os.path.join(os.path.dirname(__file__), "pdf-extraction-code.py")
+    spec = importlib.util.spec_from_file_location("pdf_extraction_code", path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so worker processes can unpickle its functions
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def test_database_rebuild_is_idempotent(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    with open(QUESTIONS_FILE, encoding="utf-8") as f:
+        questions = json.load(f)
+    db_path = str(tmp_path / "nuclear_quiz.db")
+    extraction.create_sqlite_database(questions, db_path)
+    conn = sqlite3.connect(db_path)
+    before = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+    conn.close()
+    extraction.create_sqlite_database(questions, db_path)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0] == before == len(questions)
+    assert conn.execute("SELECT COUNT(*) FROM options").fetchone()[0] == 4 * before
+    conn.close()
+    assert not os.path.exists(db_path + ".tmp")
+
+def test_normalize_html_strips_positional_markup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    raw = extraction.clean_html(
+        '<p style="top:37.4pt;left:540.0pt;line-height:9.9pt"><span style="font-family:F1,serif;font-size:9.9pt;color:#000000"> </span></p>'
+        '<p style="top:49.1pt;left:72.0pt;line-height:12.0pt"><span style="font-family:F1,serif;font-size:12.0pt;color:#000000">TOPIC: </span></p>'
+        '<p style="top:49.1pt;left:161.9pt;line-height:12.0pt"><span style="font-family:F1,serif;font-size:12.0pt;color:#000000">Valves </span></p>'
+        '<p style="top:76.7pt;left:72.0pt;line-height:12.0pt"><span style="font-family:F1,serif;font-size:12.0pt;color:#000000">Heat flux is 5 &lt; 10 W/m</span>'
+        '<sup><span style="font-family:F1,serif;font-size:8.0pt;color:#000000">2</span></sup>'
+        '<b><span style="font-family:F2,serif;font-size:12.0pt;color:#000000"> at </span></b><b><span style="font-family:F2,serif;font-size:12.0pt;color:#000000">rated </span></b></p>'
+        '<p style="top:90.5pt;left:72.0pt;line-height:12.0pt"><span style="font-family:F1,serif;font-size:12.0pt;color:#000000">power. </span></p>'
+        '<table border="1"><tr><td colspan="2" style="x">A</td></tr></table>'
+        '<p style="top:745.9pt;left:540.0pt;line-height:9.9pt"><b><i><span style="font-family:F2,serif;font-size:9.9pt;color:#000000"> </span></i></b></p>'
+    )
+    normalized = extraction.normalize_html(raw)
+    assert normalized == (
+        '<p>Heat flux is 5 &lt; 10 W/m<sup>2</sup><b> at rated</b></p><p>power.</p>'
+        '<table><tr><td colspan="2">A</td></tr></table>'
+    )
+    assert extraction.normalize_html(normalized) == normalized
+    assert extraction.normalize_html("<p>option a</p>") == "<p>option a</p>"
+
+def test_clean_html_only_rewrites_text(tmp_path, monkeypatch):
+    import json
+    import re
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    assert extraction.clean_html(
+        '<p style="top:1/2pt">Use 1/4  of\n the flow on 10/12/2020&nbsp;[2.3/2.6], about 3/4.</p>'
+    ) == (
+        '<p style="top:1/2pt">Use <span class="fraction">1/4</span> of the flow on 10/12/2020 [2.3/2.6], '
+        'about <span class="fraction">3/4</span>.</p>'
+    )
+
+    # Every stem and option of the current extraction, with the fraction
+    # markup of the earlier clean_html taken out
+    with open(QUESTIONS_FILE, encoding="utf-8") as f:
+        questions = json.load(f)
+    fraction = re.compile(r'<span class="fraction">([^<]*)</span>')
+    tag = re.compile(r'<[^>]*>')
+    for question in questions:
+        for raw in [question["question_html"]] + question["options"]:
+            raw = fraction.sub(r"\1", raw)
+            cleaned = extraction.clean_html(raw)
+            assert extraction.clean_html(cleaned) == cleaned
+            # Markup (attributes included) is untouched, text only differs in whitespace
+            unmarked = fraction.sub(r"\1", cleaned)
+            assert tag.findall(unmarked) == tag.findall(raw)
+            assert tag.sub("", unmarked).split() == tag.sub("", raw).replace("&nbsp;", " ").split()
+
+def test_questions_are_streamed_as_ndjson(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    with open(QUESTIONS_FILE, encoding="utf-8") as f:
+        questions = json.load(f)
+
+    stream = extraction.write_questions(iter(questions), str(tmp_path))
+    assert len((tmp_path / "nuclear_questions.ndjson").read_text(encoding="utf-8").splitlines()) == len(questions)
+    assert list(stream) == questions and len(stream) == len(questions)
+    # The JSON built from the stream is what json.dump used to write
+    assert (tmp_path / "nuclear_questions.json").read_text(encoding="utf-8") == json.dumps(
+        questions, ensure_ascii=False, indent=2
+    )
+    assert list(extraction.load_questions(str(tmp_path))) == questions
+
+    compact_dir = tmp_path / "compact"
+    compact_dir.mkdir()
+    extraction.write_questions(questions, str(compact_dir), "compact")
+    assert json.loads((compact_dir / "nuclear_questions.json").read_text(encoding="utf-8")) == questions
+
+    # The database loads from the stream exactly as from the list
+    extraction.create_sqlite_database(stream, str(tmp_path / "stream.db"))
+    extraction.create_sqlite_database(questions, str(tmp_path / "list.db"))
+    dumps = [list(sqlite3.connect(str(tmp_path / name)).iterdump()) for name in ("stream.db", "list.db")]
+    assert dumps[0] == dumps[1]
+
+def make_question_pdf(pdf_path, pages, topic="Topic", images=None):
+    """
+    Write a PDF with one question per page, in the layout of the exam PDFs.
+    images maps page numbers (from 0) to the RGB color of a figure drawn on
+    that page as an embedded PNG.
+    """
+    import io
+    import fitz
+    from PIL import Image
+    with fitz.open() as doc:
+        for n in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"TOPIC: {topic} {n % 3}\nWhat is {n}?\nA. one\nB. two\nC. three\nD. four\nANSWER: B")
+            if images and n in images:
+                buffer = io.BytesIO()
+                Image.new("RGB", (60, 40), images[n]).save(buffer, "PNG")
+                page.insert_image(fitz.Rect(72, 300, 252, 420), stream=buffer.getvalue())
+        doc.save(pdf_path)
+    return pdf_path
+
+def test_interrupted_extraction_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    pdf_path = make_question_pdf(str(tmp_path / "questions.pdf"), 12)
+
+    extraction.extract_questions_from_pdf(pdf_path, str(tmp_path / "full"))
+    expected = (tmp_path / "full" / "nuclear_questions.json").read_text(encoding="utf-8")
+
+    extract_page = extraction.extract_page
+    pages_done = []
+
+    def interrupted_page(doc, page_num, *args):
+        if page_num == 7:
+            raise KeyboardInterrupt
+        pages_done.append(page_num)
+        return extract_page(doc, page_num, *args)
+
+    monkeypatch.setattr(extraction, "CHECKPOINT_INTERVAL", 3)
+    monkeypatch.setattr(extraction, "extract_page", interrupted_page)
+    output_dir = str(tmp_path / "resumed")
+    with pytest.raises(KeyboardInterrupt):
+        extraction.extract_questions_from_pdf(pdf_path, output_dir)
+    assert not os.path.exists(os.path.join(output_dir, "nuclear_questions.json"))
+
+    # Only the pages after the checkpoint are extracted again
+    pages_done.clear()
+    monkeypatch.setattr(extraction, "extract_page", lambda doc, page_num, *args: (
+        pages_done.append(page_num) or extract_page(doc, page_num, *args)
+    ))
+    questions = extraction.extract_questions_from_pdf(pdf_path, output_dir, resume=True)
+    assert pages_done == list(range(7, 12))
+    assert len(questions) == 12
+    assert (tmp_path / "resumed" / "nuclear_questions.json").read_text(encoding="utf-8") == expected
+    assert not os.path.exists(os.path.join(output_dir, extraction.CHECKPOINT_FILE))
+
+def test_batch_ingestion_merges_sources_with_stable_ids(tmp_path, monkeypatch):
+    import sqlite3
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    (tmp_path / "exams").mkdir()
+    first = make_question_pdf(str(tmp_path / "exams" / "first.pdf"), 5, "First")
+    second = make_question_pdf(str(tmp_path / "exams" / "second.pdf"), 3, "Second")
+    bank = str(tmp_path / "bank")
+
+    questions, sources = extraction.ingest_pdfs(extraction.find_pdfs([str(tmp_path / "exams")]), bank)
+    assert [(source["id"], source["name"], source["pages"]) for source in sources] == [
+        (0, "first.pdf", 5), (1, "second.pdf", 3)
+    ]
+    # Source 0 keeps the page-number IDs of a single-PDF extraction
+    assert [(q["id"], q["source_id"], q["page_number"]) for q in questions] == (
+        [(page, 0, page) for page in range(1, 6)] + [(100000 + page, 1, page) for page in range(1, 4)]
+    )
+
+    # A later batch adds a source without changing the IDs of the others
+    third = make_question_pdf(str(tmp_path / "third.pdf"), 2, "Third")
+    questions, sources = extraction.ingest_pdfs([third, first], bank, incremental=True)
+    assert [source["name"] for source in sources] == ["first.pdf", "second.pdf", "third.pdf"]
+    ids = [q["id"] for q in questions]
+    assert ids == list(range(1, 6)) + [100001, 100002, 100003, 200001, 200002]
+
+    db_path = str(tmp_path / "bank" / "nuclear_quiz.db")
+    extraction.create_sqlite_database(questions, db_path, sources)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT id, name, pages FROM sources ORDER BY id').fetchall() == [
+        (0, "first.pdf", 5), (1, "second.pdf", 3), (2, "third.pdf", 2)
+    ]
+    assert conn.execute(
+        'SELECT s.name, q.page_number FROM questions q JOIN sources s ON q.source_id = s.id WHERE q.id = 200002'
+    ).fetchone() == ("third.pdf", 2)
+
+def test_batch_ingestion_keeps_an_existing_single_pdf_bank(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    first = make_question_pdf(str(tmp_path / "first.pdf"), 4, "First", images={0: (200, 0, 0)})
+    second = make_question_pdf(str(tmp_path / "second.pdf"), 2, "Second")
+    bank = str(tmp_path / "bank")
+    image = list(extraction.extract_questions_from_pdf(first, bank))[0]["images"][0]
+
+    # Growing a single-PDF extraction keeps its questions and images as source 0
+    questions, sources = extraction.ingest_pdfs([second], bank)
+    assert [source["name"] for source in sources] == ["first.pdf", "second.pdf"]
+    assert [q["id"] for q in questions] == [1, 2, 3, 4, 100001, 100002]
+    assert list(questions)[0]["images"] == [image]
+    assert os.path.exists(os.path.join(bank, "images", image))
+
+    # It is then updated like any other source
+    questions, sources = extraction.ingest_pdfs([first], bank, incremental=True)
+    assert [q["id"] for q in questions] == [1, 2, 3, 4, 100001, 100002]
+
+    # Sources are told apart by their full file name
+    (tmp_path / "other").mkdir()
+    with pytest.raises(ValueError):
+        extraction.ingest_pdfs([second, make_question_pdf(str(tmp_path / "other" / "second.pdf"), 1)], bank)
+    upper = make_question_pdf(str(tmp_path / "other" / "second.PDF"), 1, "Upper")
+    questions, sources = extraction.ingest_pdfs([upper], bank)
+    assert len({extraction.source_dir(bank, source) for source in sources}) == 3
+    assert [q["id"] for q in questions][-3:] == [100001, 100002, 200001]
+
+def test_batch_ingestion_keeps_a_bank_without_manifest(tmp_path, monkeypatch):
+    import json
+    import shutil
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    # The shipped extraction predates manifests, NDJSON and sources.json
+    bank = tmp_path / "bank"
+    bank.mkdir()
+    shutil.copy(QUESTIONS_FILE, bank)
+    shutil.copytree(os.path.join(os.path.dirname(QUESTIONS_FILE), "images"), bank / "images")
+    (bank / "images" / "cover.png").write_bytes(b"not from any source")
+    with open(QUESTIONS_FILE, encoding="utf-8") as f:
+        shipped = json.load(f)
+
+    questions, sources = extraction.ingest_pdfs([make_question_pdf(str(tmp_path / "new.pdf"), 2)], str(bank))
+    assert [(source["id"], source["name"]) for source in sources] == [(0, extraction.UNNAMED_SOURCE), (1, "new.pdf")]
+    assert sources[0]["pages"] == max(q["page_number"] for q in shipped)
+    questions = list(questions)
+    assert [{key: q[key] for key in shipped[0]} for q in questions[:-2]] == shipped
+    assert [q["id"] for q in questions[-2:]] == [100001, 100002]
+    # No image is lost, including files that no source provided
+    images = {image for q in shipped for image in q["images"]} | {"cover.png"}
+    assert images <= set(os.listdir(bank / "images"))
+
+def test_incremental_update_replaces_changed_pages(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    red, green, blue, yellow = (200, 0, 0), (0, 200, 0), (0, 0, 200), (200, 200, 0)
+    pdf_path = make_question_pdf(str(tmp_path / "exam.pdf"), 4, images={0: red, 1: green, 3: blue})
+    output_dir = str(tmp_path / "out")
+    db_path = str(tmp_path / "quiz.db")
+    questions = extraction.extract_questions_from_pdf(pdf_path, output_dir)
+    extraction.create_sqlite_database(questions, db_path)
+    images = {q["id"]: q["images"][0] for q in questions if q["images"]}
+
+    # Page 2 gets a new figure and page 4 is dropped
+    make_question_pdf(pdf_path, 3, images={0: red, 1: yellow})
+    questions, changed, removed_ids = extraction.update_questions_from_pdf(pdf_path, output_dir)
+    extraction.update_sqlite_database(changed, removed_ids, db_path)
+    assert [q["id"] for q in changed] == [2] and removed_ids == [4]
+    new_image = changed[0]["images"][0]
+    assert new_image not in images.values()
+
+    with open(os.path.join(output_dir, extraction.QUESTIONS_JSON)) as f:
+        saved = json.load(f)
+    with open(os.path.join(output_dir, extraction.QUESTIONS_NDJSON)) as f:
+        assert [json.loads(line) for line in f] == saved
+    assert [q["id"] for q in saved] == [1, 2, 3]
+    assert [q["images"] for q in saved] == [[images[1]], [new_image], []]
+
+    conn = sqlite3.connect(db_path)
+    assert [row[0] for row in conn.execute("SELECT id FROM questions ORDER BY id")] == [1, 2, 3]
+    assert {row[0] for row in conn.execute("SELECT question_id FROM options")} == {1, 2, 3}
+    assert sorted(conn.execute("SELECT question_id, image_path FROM images")) == [(1, images[1]), (2, new_image)]
+    conn.close()
+
+    # The figures of the replaced and removed pages are pruned
+    assert sorted(os.listdir(os.path.join(output_dir, "images"))) == sorted([images[1], new_image])
+
+def test_image_store_dedups_images(tmp_path, monkeypatch):
+    import io
+    import fitz
+    from PIL import Image
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    output_dir = str(tmp_path / "out")
+    os.makedirs(os.path.join(output_dir, "images"))
+
+    def encode(color, fmt):
+        buffer = io.BytesIO()
+        Image.new("RGB", (30, 20), color).save(buffer, fmt)
+        return buffer.getvalue()
+
+    # Names are derived from the content only
+    png = encode((0, 0, 200), "PNG")
+    name = extraction.save_image(png, "png", output_dir)
+    assert extraction.CONTENT_ADDRESSED_NAME.match(name)
+    assert extraction.save_image(png, "png", output_dir) == name
+    assert os.listdir(os.path.join(output_dir, "images")) == [name]
+
+    # An image drawn on several pages is extracted once
+    with fitz.open() as doc:
+        xref = doc.new_page().insert_image(fitz.Rect(72, 72, 172, 142), stream=png)
+        doc.new_page().insert_image(fitz.Rect(72, 72, 172, 142), xref=xref)
+        extract_image = doc.extract_image
+        extracted = []
+        monkeypatch.setattr(doc, "extract_image", lambda x: extracted.append(x) or extract_image(x))
+        saved_xrefs = {}
+        first, second = (extraction.extract_images(doc, page, output_dir, saved_xrefs) for page in doc)
+        assert first == second and saved_xrefs == {xref: first[0]}
+        assert extracted == [xref]
+
+def test_migrate_image_store_renames_and_collapses_images(tmp_path, monkeypatch):
+    import io
+    import json
+    import sqlite3
+    from PIL import Image
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    output_dir = str(tmp_path / "out")
+    images_dir = os.path.join(output_dir, "images")
+    os.makedirs(images_dir)
+
+    def write_image(filename, color, fmt):
+        buffer = io.BytesIO()
+        Image.new("RGB", (30, 20), color).save(buffer, fmt)
+        with open(os.path.join(images_dir, filename), "wb") as f:
+            f.write(buffer.getvalue())
+        return buffer.getvalue()
+
+    # Per-question names, a JPEG saved as .png, and the same figure saved twice
+    jpeg = write_image("question_1_img_0.png", (200, 0, 0), "JPEG")
+    write_image("question_2_img_0.png", (200, 0, 0), "JPEG")
+    png = write_image("question_2_img_1.png", (0, 200, 0), "PNG")
+    questions = [
+        {"id": n, "topic": "T", "question_html": f"<p>Q{n}</p>", "options": [], "answer": "A",
+         "page_number": n, "images": images}
+        for n, images in enumerate([
+            ["question_1_img_0.png"], ["question_2_img_0.png", "question_2_img_1.png"], ["question_3_img_0.png"]
+        ], 1)
+    ]
+    extraction.write_questions(questions, output_dir)
+    db_path = os.path.join(output_dir, "nuclear_quiz.db")
+    extraction.create_sqlite_database(questions, db_path)
+
+    questions = list(extraction.migrate_image_store(output_dir, db_path=db_path))
+    jpeg_name, png_name = questions[0]["images"][0], questions[1]["images"][1]
+    assert jpeg_name.endswith(".jpeg") and png_name.endswith(".png")
+    assert [q["images"] for q in questions] == [[jpeg_name], [jpeg_name, png_name], ["question_3_img_0.png"]]
+    with open(os.path.join(output_dir, extraction.QUESTIONS_JSON)) as f:
+        assert [q["images"] for q in json.load(f)] == [q["images"] for q in questions]
+    # The database the backend serves from lists the new names too
+    conn = sqlite3.connect(db_path)
+    assert sorted(conn.execute("SELECT question_id, image_path FROM images")) == sorted([
+        (1, jpeg_name), (2, jpeg_name), (2, png_name), (3, "question_3_img_0.png")
+    ])
+    conn.close()
+
+    # Every referenced image is still there with its bytes, and nothing else is
+    assert sorted(os.listdir(images_dir)) == sorted([jpeg_name, png_name])
+    with open(os.path.join(images_dir, jpeg_name), "rb") as f:
+        assert f.read() == jpeg
+    with open(os.path.join(images_dir, png_name), "rb") as f:
+        assert f.read() == png
+
+def test_parallel_extraction_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    pdf_path = make_question_pdf(str(tmp_path / "exam.pdf"), 7, images={1: (200, 0, 0), 4: (0, 0, 200), 5: (200, 0, 0)})
+    outputs = {}
+    for workers in (1, 2):
+        output_dir = tmp_path / f"workers-{workers}"
+        extraction.extract_questions_from_pdf(pdf_path, str(output_dir), workers=workers)
+        outputs[workers] = {
+            path.relative_to(output_dir): path.read_bytes()
+            for path in output_dir.rglob("*")
+            if path.is_file()
+        }
+    assert outputs[2] == outputs[1]
+
+def test_find_diagram_content_crops_to_the_drawing(tmp_path, monkeypatch):
+    import fitz
+    from PIL import Image, ImageDraw
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+
+    assert extraction.find_diagram_content(Image.new("RGB", (400, 300), "white")) is None
+    # A few specks stay below the threshold
+    specks = Image.new("RGB", (400, 300), "white")
+    ImageDraw.Draw(specks).rectangle((10, 10, 29, 29), fill="black")
+    assert extraction.find_diagram_content(specks) is None
+
+    drawing = Image.new("RGB", (400, 300), "white")
+    ImageDraw.Draw(drawing).rectangle((100, 50, 299, 149), fill="black")
+    box = extraction.find_diagram_content(drawing)
+    assert box == (100, 50, 300, 150)
+    assert extraction.pad_box(box, 8, 400, 300) == (92, 42, 308, 158)
+    assert extraction.pad_box((2, 3, 398, 297), 8, 400, 300) == (0, 0, 400, 300)
+
+    # A page with a vector diagram and no raster images is rendered at 2x
+    # and cropped to the diagram plus DIAGRAM_CROP_MARGIN
+    output_dir = str(tmp_path / "out")
+    os.makedirs(os.path.join(output_dir, "images"))
+    with fitz.open() as doc:
+        page = doc.new_page()
+        page.draw_rect(fitz.Rect(100, 200, 400, 500), color=(0, 0, 0), fill=(0, 0, 0))
+        images = extraction.extract_images(doc, page, output_dir)
+    assert len(images) == 1
+    with Image.open(os.path.join(output_dir, "images", images[0])) as img:
+        width, height = img.size
+    margin = 2 * extraction.DIAGRAM_CROP_MARGIN
+    assert abs(width - (600 + margin)) <= 4 and abs(height - (600 + margin)) <= 4
+
+def test_pages_without_diagrams_are_not_rendered(tmp_path, monkeypatch):
+    import fitz
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+    output_dir = str(tmp_path / "out")
+    os.makedirs(os.path.join(output_dir, "images"))
+    with fitz.open() as doc:
+        blank = doc.new_page()
+        ruled = doc.new_page()
+        ruled.insert_text((72, 72), "What is shown below?")
+        ruled.draw_line(fitz.Point(72, 80), fitz.Point(540, 80))
+        diagram = doc.new_page()
+        diagram.draw_circle(fitz.Point(300, 300), 100)
+        assert [extraction.has_vector_drawings(page) for page in doc] == [False, False, True]
+
+        # Only the page with a diagram is rendered
+        rendered = []
+        get_pixmap = fitz.Page.get_pixmap
+
+        def recording_get_pixmap(page, *args, **kwargs):
+            rendered.append(page.number)
+            return get_pixmap(page, *args, **kwargs)
+        monkeypatch.setattr(fitz.Page, "get_pixmap", recording_get_pixmap)
+        for page in doc:
+            extraction.extract_images(doc, page, output_dir)
+        assert rendered == [2]
+
+def test_checkpoint_never_covers_an_uncounted_line(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    extraction = load_extraction_module()
+
+    class InterruptingTopic(str):
+        # Interrupts write_questions after the question's line is written,
+        # before it is counted
+        def __hash__(self):
+            raise KeyboardInterrupt
+
+    def questions():
+        for n in (1, 2):
+            yield {"id": n, "topic": "T", "images": []}
+        yield {"id": 3, "topic": InterruptingTopic("T"), "images": []}
+
+    checkpoint = extraction.new_checkpoint("exam.pdf", ["a", "b", "c"])
+    with pytest.raises(KeyboardInterrupt):
+        extraction.write_questions(questions(), str(tmp_path), checkpoint=checkpoint)
+    partial_path = tmp_path / (extraction.QUESTIONS_NDJSON + ".partial")
+    assert len(partial_path.read_bytes().splitlines()) == 3
+
+    resumed = extraction.new_checkpoint("exam.pdf", ["a", "b", "c"])
+    assert extraction.resume_checkpoint(resumed, str(tmp_path)) == 2
+    assert partial_path.read_text().splitlines() == [
+        '{"id": 1, "topic": "T", "images": []}', '{"id": 2, "topic": "T", "images": []}'
+    ]